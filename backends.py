@@ -0,0 +1,352 @@
+"""
+Model backends behind one interface: a callable with `ollama.chat`'s signature.
+
+`OllamaBackend` forwards to the Ollama server; `TransformersEngine` runs
+Gemma 3 in-process with Hugging Face transformers, on GPU or CPU.  Both
+return `ollama.ChatResponse` objects, so the control loop, `MockChat` and
+the benchmark can swap one for another:
+
+    engine = TransformersEngine("google/gemma-3-4b-it", device="cpu", threads=8, quantize=True)
+    reply = engine(model="", messages=[{"role": "user", "content": "...", "images": [jpeg]}])
+"""
+from __future__ import annotations
+
+import hashlib
+import inspect
+import io
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ollama import ChatResponse
+
+
+class ChatBackend(ABC):
+    """Interface shared by the backends: `ollama.chat(model, messages, ...)`."""
+
+    @abstractmethod
+    def __call__(self, model: str = "", messages=None, *, stream: bool = False,
+                 format=None, options=None, keep_alive=None, **kwargs):
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+def keep_alive_value(text: str) -> str | float:
+    """`keep_alive` from the command line: bare numbers are seconds, anything else a duration like "30m"."""
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+class OllamaBackend(ChatBackend):
+    """The Ollama server, with an optional default `keep_alive`."""
+
+    def __init__(self, keep_alive: str | float | None = None):
+        self.keep_alive = keep_alive
+
+    def __call__(self, model: str = "", messages=None, *, stream: bool = False,
+                 format=None, options=None, keep_alive=None, **kwargs):
+        from ollama import chat
+        return chat(model=model, messages=messages, stream=stream, format=format,
+                    options=options, keep_alive=keep_alive if keep_alive is not None else self.keep_alive,
+                    **kwargs)
+
+
+class _Request:
+    def __init__(self, conversation: list, images: list, max_new_tokens: int):
+        self.conversation = conversation
+        self.images = images        # [(sha256, PIL image)] in prompt order
+        self.max_new_tokens = max_new_tokens
+        self.future: Future = Future()
+        self.queued = time.perf_counter()
+
+
+class TransformersEngine(ChatBackend):
+    """
+    Long-lived Gemma 3 engine that batches concurrent requests.
+
+    The model is loaded once.  Calls from any thread are queued, and a
+    worker collects up to `max_batch` of them (waiting at most `max_wait`
+    seconds for company) into one left-padded `generate` call.  On CPU,
+    `threads` sets torch's intra-op threads and `quantize` applies dynamic
+    int8 quantization to the linear layers.
+
+    Images `pin_image()`d once (e.g. a reference photo sent with every
+    prompt) keep their vision-tower output, and are not even decoded again
+    when they recur; with `feature_cache` that output is also saved to disk
+    per (model, image SHA-256) and reloaded on the next start.  Tokenized
+    prompts are reused from a small LRU, so per request only new frames are
+    encoded.
+
+    `format` schemas are not enforced (there is no constrained decoding
+    here); the prompt has to ask for JSON itself.
+    """
+
+    def __init__(self, model_id: str = "google/gemma-3-4b-it", *, model=None, processor=None,
+                 device: str = "cpu", threads: int | None = None, quantize: bool = False,
+                 dtype=None, max_batch: int = 4, max_wait: float = 0.02,
+                 max_new_tokens: int = 150, prompt_cache: int = 32,
+                 feature_cache: str | None = None):
+        try:
+            import torch
+            from transformers import AutoProcessor, Gemma3ForConditionalGeneration
+        except ImportError as e:
+            raise RuntimeError("torch and transformers are needed for the transformers backend") from e
+        self.torch = torch
+        if threads:
+            torch.set_num_threads(threads)
+        if dtype is None:
+            # bf16 matmuls are slow on most CPUs, and dynamic quantization wants fp32
+            dtype = torch.float32 if device == "cpu" else torch.bfloat16
+
+        started = time.perf_counter()
+        if processor is None:
+            processor = AutoProcessor.from_pretrained(model_id, padding_side="left", use_fast=True)
+        if model is None:
+            model = Gemma3ForConditionalGeneration.from_pretrained(
+                model_id, torch_dtype=dtype, attn_implementation="sdpa")
+        model = model.to(device=device, dtype=dtype).eval()
+        if quantize:
+            if device != "cpu":
+                raise RuntimeError("dynamic int8 quantization only runs on the CPU")
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.load_duration = time.perf_counter() - started
+
+        self.model_id = model_id
+        self.model = model
+        self.processor = processor
+        self.tokenizer = processor.tokenizer
+        self.tokenizer.padding_side = "left"
+        self.device = device
+        self.dtype = dtype
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.max_new_tokens = max_new_tokens
+        self.image_token_id = (getattr(model.config, "image_token_id", None)
+                               or model.config.image_token_index)
+        self._takes_encoder_outputs = "mm_encoder_outputs" in inspect.signature(model.forward).parameters
+        self.batches = 0
+        self._pinned: dict[str, object] = {}
+        self._prompts: OrderedDict = OrderedDict()
+        self._prompt_cache = prompt_cache
+        self.feature_cache = feature_cache
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="transformers-engine", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, config, processor, **kwargs) -> "TransformersEngine":
+        """Engine around a randomly initialised model, e.g. a tiny Gemma3Config for tests."""
+        from transformers import Gemma3ForConditionalGeneration
+        return cls(model=Gemma3ForConditionalGeneration(config), processor=processor, **kwargs)
+
+    # -- requests -------------------------------------------------------
+
+    def __call__(self, model: str = "", messages=None, *, stream: bool = False,
+                 format=None, options=None, keep_alive=None, **kwargs):
+        limit = (options or {}).get("num_predict") or self.max_new_tokens
+        response = self.submit(list(messages or []), limit).result()
+        if stream:
+            return self._stream(response)
+        return response
+
+    @staticmethod
+    def _stream(response: ChatResponse):
+        from ollama import ChatResponse, Message
+        # generation is batched, so the whole reply arrives as one chunk
+        yield ChatResponse(model=response.model, done=False,
+                           message=Message(role="assistant", content=response.message.content))
+        yield response.model_copy(update={"message": Message(role="assistant", content="")})
+
+    def submit(self, messages: list, max_new_tokens: int | None = None) -> Future:
+        """Queue a chat request; the Future resolves to a `ChatResponse`."""
+        conversation, images = self._conversation(messages)
+        request = _Request(conversation, images, max_new_tokens or self.max_new_tokens)
+        self._queue.put(request)
+        return request.future
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    # -- images ---------------------------------------------------------
+
+    def _load(self, image) -> tuple[str, object]:
+        """`(sha256, PIL image)`; pinned images are only hashed, not decoded."""
+        from PIL import Image
+        if isinstance(image, (str, Path)):
+            image = Path(image).read_bytes()
+        key = hashlib.sha256(image).hexdigest()
+        if key in self._pinned:
+            return key, None
+        return key, Image.open(io.BytesIO(image)).convert("RGB")
+
+    def _conversation(self, messages: list) -> tuple[list, list]:
+        """Ollama-style messages (or HF content lists) → HF chat format plus the images in order."""
+        conversation, images = [], []
+        for message in messages:
+            content = message.get("content", "")
+            if isinstance(content, list):
+                parts = []
+                for part in content:
+                    if part.get("type") == "image":
+                        images.append(self._load(part.get("path") or part.get("image")))
+                        parts.append({"type": "image"})
+                    else:
+                        parts.append(part)
+            else:
+                parts = []
+                for image in message.get("images") or []:
+                    images.append(self._load(image))
+                    parts.append({"type": "image"})
+                parts.append({"type": "text", "text": content})
+            conversation.append({"role": message["role"], "content": parts})
+        return conversation, images
+
+    def pin_image(self, image) -> str:
+        """Encode an image that recurs in every prompt once and keep its features."""
+        key, pil = self._load(image)
+        if key in self._pinned:
+            return key
+        cached = None
+        if self.feature_cache:
+            cached = Path(self.feature_cache) / f"{self.model_id.replace('/', '--')}-{key}.pt"
+            if cached.exists():
+                self._pinned[key] = self.torch.load(cached, map_location=self.device)
+                return key
+        self._pinned[key] = self._encode([pil])[0]
+        if cached is not None:
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            self.torch.save(self._pinned[key].cpu(), cached)
+        return key
+
+    def _encode(self, images: list):
+        with self.torch.inference_mode():
+            pixel_values = self.processor.image_processor(images=images, return_tensors="pt")["pixel_values"]
+            features = self.model.get_image_features(pixel_values.to(self.device, dtype=self.dtype))
+        # transformers 5 wraps the projected features in a model output
+        return getattr(features, "pooler_output", features)
+
+    def _image_features(self, images: list):
+        fresh = [pil for key, pil in images if key not in self._pinned]
+        encoded = iter(self._encode(fresh)) if fresh else iter(())
+        return self.torch.stack([self._pinned[key] if key in self._pinned else next(encoded)
+                                 for key, _ in images])
+
+    # -- prompts --------------------------------------------------------
+
+    def _token_ids(self, conversation: list) -> list[int]:
+        text = self.processor.apply_chat_template(conversation, tokenize=False,
+                                                  add_generation_prompt=True)
+        ids = self._prompts.get(text)
+        if ids is None:
+            expanded = text.replace(self.processor.boi_token, self.processor.full_image_sequence)
+            # the template already starts with <bos>
+            ids = self.tokenizer(expanded, add_special_tokens=False)["input_ids"]
+            self._prompts[text] = ids
+            while len(self._prompts) > self._prompt_cache:
+                self._prompts.popitem(last=False)
+        else:
+            self._prompts.move_to_end(text)
+        return ids
+
+    def _batch_inputs(self, batch: list) -> dict:
+        torch = self.torch
+        rows = [self._token_ids(r.conversation) for r in batch]
+        width = max(len(ids) for ids in rows)
+        pad = self.tokenizer.pad_token_id
+        input_ids = torch.tensor([[pad] * (width - len(ids)) + ids for ids in rows], device=self.device)
+        attention_mask = torch.tensor([[0] * (width - len(ids)) + [1] * len(ids) for ids in rows],
+                                      device=self.device)
+        token_type_ids = (input_ids == self.image_token_id).long()
+        images = [image for r in batch for image in r.images]
+        with torch.inference_mode():
+            features = self._image_features(images) if images else None
+            if self._takes_encoder_outputs:
+                # transformers 5 accepts precomputed image features directly
+                from transformers.modeling_outputs import BaseModelOutputWithPooling
+                inputs = {"input_ids": input_ids, "attention_mask": attention_mask,
+                          "token_type_ids": token_type_ids}
+                if features is not None:
+                    inputs["mm_encoder_outputs"] = {"image": BaseModelOutputWithPooling(pooler_output=features)}
+                return inputs
+            embeds = self.model.get_input_embeddings()(input_ids)
+            if features is not None:
+                mask = (input_ids == self.image_token_id).unsqueeze(-1).expand_as(embeds)
+                embeds = embeds.masked_scatter(mask, features.to(embeds.dtype))
+        return {"inputs_embeds": embeds, "attention_mask": attention_mask,
+                "token_type_ids": token_type_ids}
+
+    # -- worker ---------------------------------------------------------
+
+    def _next_batch(self) -> list | None:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                request = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                responses = self._generate(batch)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(RuntimeError(f"Generation failed: {e}"))
+                continue
+            for request, response in zip(batch, responses):
+                request.future.set_result(response)
+
+    def _generate(self, batch: list) -> list[ChatResponse]:
+        from ollama import ChatResponse, Message
+        started = time.perf_counter()
+        inputs = self._batch_inputs(batch)
+        prefilled = time.perf_counter()
+        with self.torch.inference_mode():
+            output = self.model.generate(**inputs, do_sample=False,
+                                         max_new_tokens=max(r.max_new_tokens for r in batch),
+                                         pad_token_id=self.tokenizer.pad_token_id)
+        if "input_ids" in inputs:
+            # with inputs_embeds only the new tokens are returned, with input_ids the prompt too
+            output = output[:, inputs["input_ids"].shape[1]:]
+        finished = time.perf_counter()
+        self.batches += 1
+        prompt_counts = inputs["attention_mask"].sum(dim=1).tolist()
+        responses = []
+        for request, tokens, prompt_count in zip(batch, output, prompt_counts):
+            tokens = tokens[:request.max_new_tokens]
+            generated = tokens[tokens != self.tokenizer.pad_token_id]
+            text = self.tokenizer.decode(generated, skip_special_tokens=True)
+            responses.append(ChatResponse(
+                model=self.model_id, done=True, done_reason="stop",
+                message=Message(role="assistant", content=text),
+                prompt_eval_count=int(prompt_count),
+                prompt_eval_duration=int((prefilled - started) * 1e9),
+                eval_count=int(len(generated)),
+                eval_duration=int((finished - prefilled) * 1e9),
+                load_duration=0,
+                total_duration=int((finished - request.queued) * 1e9),
+            ))
+        return responses
@@ -0,0 +1,185 @@
+"""
+End-to-end benchmark of the control loop against `SimRobot` and `MockChat`.
+
+Runs `decide_command` on its own and the full loop in several modes, then
+reports steps/sec, per-stage latency percentiles, prompt size and Python
+heap growth over the mission:
+
+    python benchmark.py --steps 40 --token-rate 25 --latency 0.03 --jitter 0.01
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from mock_llm import MockChat
+from sim_robot import SimRobot
+
+# loop + run_ollama settings for each benchmark mode
+MODES = {
+    "serial": {"loop": "serial"},
+    "serial-settled": {"loop": "serial", "delay": 0.0},
+    "pipelined": {"loop": "pipelined"},
+    "in-memory": {"loop": "pipelined", "in_memory": True},
+    "json": {"loop": "pipelined", "in_memory": True, "output_mode": "json"},
+    "stream": {"loop": "pipelined", "in_memory": True, "streaming": True},
+    "map": {"loop": "pipelined", "in_memory": True, "map": True},
+    "sampler": {"loop": "pipelined", "in_memory": True, "sampler": True},
+    "safety": {"loop": "pipelined", "in_memory": True, "sampler": True, "safety": True},
+    "plan": {"loop": "plan", "in_memory": True},
+    "preprocess": {"loop": "pipelined", "in_memory": True, "frame_size": 896},
+}
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def configure(ro, chat, mode: dict, metrics_path: str | None) -> None:
+    """Reset run_ollama's module state for a fresh mission in `mode`."""
+    # run_ollama leaves these to the features that use them; imported here,
+    # after ROBOT_URL points at the simulator
+    from occupancy_grid import OccupancyGrid
+    from preprocess import FramePreprocessor
+    from safety import SafetyMonitor
+    from sensors import SensorSampler
+
+    ro.chat = chat
+    ro.memory = ro.ConversationMemory()
+    ro.metrics = ro.MetricsRecorder(metrics_path)
+    ro.auto_confirm = True
+    ro.output_mode = mode.get("output_mode", "text")
+    ro.streaming = mode.get("streaming", False)
+    ro.pose = ro.Pose()
+    ro.occupancy = OccupancyGrid() if mode.get("map") else None
+    ro.sampler = SensorSampler(ro.robot).start() if mode.get("sampler") else None
+    if ro.sampler is not None:
+        ro.sampler.wait_ready()
+    ro.safety = SafetyMonitor(ro.robot, ro.sampler) if mode.get("safety") else None
+    ro.last_move_end = 0.0
+    ro.first_command_s = None
+    ro.started_at = time.perf_counter()
+    ro.preprocessor = FramePreprocessor(mode["frame_size"]) if mode.get("frame_size") else None
+
+
+def bench_decide(ro, n: int) -> dict:
+    """Latency of `decide_command` alone on a fixed in-memory frame."""
+    frame = ro.robot.capture()
+    latencies = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        ro.decide_command(frame, 1.5)
+        latencies.append(time.perf_counter() - t0)
+    return {"calls": n, "p50_ms": statistics.median(latencies) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000}
+
+
+def bench_loop(ro, mode: dict, steps: int, serial_delay: float, metrics_path: str) -> dict:
+    tracemalloc.start()
+    heap_start = tracemalloc.get_traced_memory()[0]
+    t0 = time.perf_counter()
+    if mode["loop"] == "plan":
+        done = ro.run_planned(max_steps=steps, in_memory=mode.get("in_memory", False))
+    else:
+        serial = mode["loop"] == "serial"
+        done = ro.run_loop(max_steps=steps, settle=mode.get("delay", serial_delay) if serial else 0.0,
+                           in_memory=mode.get("in_memory", False), concurrent_sense=not serial)
+    elapsed = time.perf_counter() - t0
+    heap_end, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ro.metrics.close()
+    if ro.sampler is not None:
+        ro.sampler.close()
+
+    with open(metrics_path) as f:
+        records = [json.loads(line) for line in f]
+    stages: dict[str, list[float]] = {}
+    for record in records:
+        for stage, ms in record["spans"].items():
+            stages.setdefault(stage, []).append(ms)
+    prompt_tokens = [r["ollama"].get("prompt_eval_count") for r in records
+                     if r["ollama"].get("prompt_eval_count") is not None]
+    return {
+        "steps": done,
+        "inferences": sum(1 for r in records if "inference" in r["spans"]),
+        "elapsed_s": elapsed,
+        "steps_per_s": done / elapsed if elapsed else 0.0,
+        "step_p50_ms": statistics.median(r["total_ms"] for r in records) if records else 0.0,
+        "step_p99_ms": percentile([r["total_ms"] for r in records], 0.99) if records else 0.0,
+        "stages": {name: (statistics.median(v), percentile(v, 0.99)) for name, v in stages.items()},
+        "prompt_tokens_first_last": (prompt_tokens[0], prompt_tokens[-1]) if prompt_tokens else None,
+        "memory_tokens": ro.memory.tokens(),
+        "heap_growth_kb": (heap_end - heap_start) / 1024,
+        "heap_peak_kb": heap_peak / 1024,
+    }
+
+
+def report(name: str, result: dict) -> None:
+    print(f"\n== {name}: {result['steps']} steps in {result['elapsed_s']:.1f} s "
+          f"→ {result['steps_per_s']:.2f} steps/s ({60 * result['steps_per_s']:.1f}/min)")
+    print(f"   step p50 {result['step_p50_ms']:.0f} ms, p99 {result['step_p99_ms']:.0f} ms, "
+          f"{result['inferences']} inferences")
+    for stage, (p50, p99) in sorted(result["stages"].items()):
+        print(f"   {stage:<12} p50 {p50:8.1f} ms   p99 {p99:8.1f} ms")
+    if result["prompt_tokens_first_last"]:
+        first, last = result["prompt_tokens_first_last"]
+        print(f"   prompt tokens evaluated: first {first}, last {last}; "
+              f"memory block ≈{result['memory_tokens']} tokens")
+    print(f"   heap growth {result['heap_growth_kb']:.0f} KiB, peak {result['heap_peak_kb']:.0f} KiB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the control loop against local stand-ins")
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--modes", default=",".join(MODES),
+                        help=f"comma-separated subset of: {', '.join(MODES)}")
+    parser.add_argument("--latency", type=float, default=0.03, help="robot API mean delay (s)")
+    parser.add_argument("--jitter", type=float, default=0.01, help="robot API delay std-dev (s)")
+    parser.add_argument("--move-speed", type=float, default=0.0,
+                        help="simulated metres per second (0 = moves complete instantly)")
+    parser.add_argument("--async-moves", action="store_true",
+                        help="simulated /move returns at once; completion via /move/status")
+    parser.add_argument("--token-rate", type=float, default=25.0, help="mock generation tokens/s")
+    parser.add_argument("--prompt-rate", type=float, default=600.0, help="mock prompt-eval tokens/s")
+    parser.add_argument("--reasoning-tokens", type=int, default=80)
+    parser.add_argument("--serial-delay", type=float, default=2.0,
+                        help="blind sleep between steps in the serial baseline")
+    parser.add_argument("--decide-calls", type=int, default=5,
+                        help="isolated decide_command calls to time (0 to skip)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the loop's own output")
+    args = parser.parse_args()
+
+    sim = SimRobot(latency=args.latency, jitter=args.jitter, move_speed=args.move_speed,
+                   async_moves=args.async_moves).start()
+    os.environ["ROBOT_URL"] = sim.url
+    workdir = tempfile.mkdtemp(prefix="robot-bench-")
+    os.chdir(workdir)
+    import run_ollama as ro
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    results = {}
+    with quiet:
+        if args.decide_calls:
+            configure(ro, MockChat(args.token_rate, args.prompt_rate,
+                                   reasoning_tokens=args.reasoning_tokens), MODES["in-memory"], None)
+            results["decide_command"] = bench_decide(ro, args.decide_calls)
+        for name in args.modes.split(","):
+            metrics_path = os.path.join(workdir, f"{name}.jsonl")
+            configure(ro, MockChat(args.token_rate, args.prompt_rate,
+                                   reasoning_tokens=args.reasoning_tokens), MODES[name], metrics_path)
+            results[name] = bench_loop(ro, MODES[name], args.steps, args.serial_delay, metrics_path)
+
+    print(f"robot {sim.url} latency {args.latency * 1000:.0f}±{args.jitter * 1000:.0f} ms, "
+          f"mock model {args.token_rate:g} tok/s, workdir {workdir}", file=sys.stderr)
+    if "decide_command" in results:
+        d = results.pop("decide_command")
+        print(f"decide_command × {d['calls']}: p50 {d['p50_ms']:.0f} ms, p99 {d['p99_ms']:.0f} ms")
+    for name, result in results.items():
+        report(name, result)
+    sim.stop()
@@ -0,0 +1,343 @@
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+import zipfile
+from collections import deque
+
+INDEX = "index.jsonl"
+
+
+class CaptureStore:
+    """
+    Bounded, collision-free store for captured frames.
+
+    Frames get monotonic names (`frame_00000042.jpg`, continuing across
+    restarts) or, with `naming="content"`, names from their SHA-256 so an
+    identical frame is stored once.  At most `max_frames` frames (and
+    `max_bytes`, if set) are kept in `folder`; the oldest are evicted,
+    either deleted or, with `archive`, packed `segment_frames` at a time
+    into compressed `segment_000001.zip` files by the background thread.
+    Frames waiting for a full segment stay on disk until it is written.
+
+    Each writable open starts a new run; `index.jsonl` maps every sequence
+    number, and every (run, step) pair, to a file or archive member, so
+    `path()` and `read()` look a frame up in O(1) without listing the
+    directory.  `put()` writes synchronously and returns the path;
+    `submit()` never blocks and drops the frame if the writer has
+    `max_pending` frames queued.
+
+    With `readonly` the index is only loaded: no writer thread, nothing
+    appended and no compaction on `close()`, so a folder can be read while
+    another process is recording into it.  Steps then default to the
+    latest run.
+    """
+
+    def __init__(self, folder: str = "captures", max_frames: int = 1000,
+                 max_bytes: int | None = None, naming: str = "sequence",
+                 archive: bool = False, segment_frames: int = 200, max_pending: int = 32,
+                 readonly: bool = False):
+        if naming not in ("sequence", "content"):
+            raise ValueError(f"unknown naming scheme {naming!r}")
+        self.folder = folder
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.naming = naming
+        self.archive = archive
+        self.segment_frames = segment_frames
+        self.max_pending = max_pending
+        self.readonly = readonly
+        self.dropped = 0
+        self.disk_bytes = 0
+        self.seq = 0
+        self.run = 0
+        self.segments = 0
+        self._entries: dict[int, dict] = {}      # seq -> entry
+        self._by_step: dict[tuple, int] = {}     # (run, step) -> seq
+        self._by_name: dict[str, int] = {}       # content name -> seq while on disk
+        self._ring: deque[int] = deque()          # seqs on disk, oldest first
+        self._unarchived: list[int] = []         # evicted, waiting for a full segment
+        self._lock = threading.Lock()            # index, ring and name maps; no disk I/O
+        if readonly:
+            self._load_index()
+            return
+        os.makedirs(folder, exist_ok=True)
+        self._load_index()
+        self.run += 1
+        self._index = open(os.path.join(folder, INDEX), "a", buffering=1)
+        self._pending = 0
+        self._pending_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="capture-store", daemon=True)
+        self._thread.start()
+
+    # -- writing --------------------------------------------------------
+
+    def put(self, data: bytes, step: int | None = None) -> str:
+        """Store a frame now and return its path."""
+        if self.readonly:
+            raise RuntimeError(f"capture store {self.folder} is open read-only")
+        with self._lock:
+            seq = self.seq
+            if self.naming == "content":
+                name = f"{hashlib.sha256(data).hexdigest()[:24]}.jpg"
+                same = self._by_name.get(name)
+                if same is not None:
+                    # same picture as a frame still on disk: point the step at it
+                    if step is not None:
+                        self._by_step[self.run, step] = same
+                        self._log({"run": self.run, "step": step, "seq": same})
+                    return os.path.join(self.folder, name)
+                # reserve the name so an eviction of an older copy leaves it alone
+                self._by_name[name] = seq
+            else:
+                name = f"frame_{seq:08d}.jpg"
+            self.seq += 1
+        path = os.path.join(self.folder, name)
+        try:
+            with open(f"{path}.tmp", "wb") as f:
+                f.write(data)
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            with self._lock:
+                if self._by_name.get(name) == seq:
+                    del self._by_name[name]
+                for key in [key for key, aliased in self._by_step.items() if aliased == seq]:
+                    del self._by_step[key]
+            raise
+
+        entry = {"seq": seq, "run": self.run, "step": step, "name": name,
+                 "bytes": len(data), "t": round(time.time(), 3)}
+        with self._lock:
+            self._add(entry)
+            self._log(entry)
+            evicted = self._over_limit()
+        if evicted:
+            self._queue.put(("evict", evicted))
+        return path
+
+    def submit(self, data: bytes, step: int | None = None) -> None:
+        """Store a frame from the background thread; never blocks the caller."""
+        if self.readonly:
+            raise RuntimeError(f"capture store {self.folder} is open read-only")
+        with self._pending_lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending += 1
+        self._queue.put(("write", data, step))
+
+    def _add(self, entry: dict) -> None:
+        seq = entry["seq"]
+        self._entries[seq] = entry
+        if entry.get("step") is not None:
+            self._by_step[entry.get("run", 0), entry["step"]] = seq
+        self._by_name[entry["name"]] = seq
+        self._ring.append(seq)
+        self.disk_bytes += entry["bytes"]
+
+    def _over_limit(self) -> list[dict]:
+        evicted = []
+        while len(self._ring) > 1 and (
+                len(self._ring) > self.max_frames
+                or (self.max_bytes is not None and self.disk_bytes > self.max_bytes)):
+            entry = self._entries[self._ring.popleft()]
+            entry["evicted"] = True
+            self.disk_bytes -= entry["bytes"]
+            if self._by_name.get(entry["name"]) == entry["seq"]:
+                del self._by_name[entry["name"]]
+            self._log({"seq": entry["seq"], "evicted": True})
+            evicted.append(entry)
+        return evicted
+
+    def _log(self, record: dict) -> None:
+        self._index.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    # -- background work ------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                if self._queue.empty():
+                    return
+                # evictions queued by the last background writes go first
+                self._queue.put(None)
+                continue
+            try:
+                if item[0] == "write":
+                    try:
+                        self.put(item[1], item[2])
+                    finally:
+                        with self._pending_lock:
+                            self._pending -= 1
+                else:
+                    self._evict(item[1])
+            except OSError as e:
+                print(f"⚠️  Capture store: {e}")
+
+    def _evict(self, entries: list[dict]) -> None:
+        if not self.archive:
+            for entry in entries:
+                if self._unlink(entry):
+                    with self._lock:
+                        entry["deleted"] = True
+                        self._log({"seq": entry["seq"], "deleted": True})
+            return
+        self._unarchived.extend(entry["seq"] for entry in entries)
+        while len(self._unarchived) >= self.segment_frames:
+            batch = self._unarchived[:self.segment_frames]
+            del self._unarchived[:self.segment_frames]
+            self._write_segment(batch)
+
+    def _write_segment(self, seqs: list[int]) -> None:
+        """Pack evicted frames into the next zip segment, then delete them."""
+        self.segments += 1
+        segment = f"segment_{self.segments:06d}.zip"
+        path = os.path.join(self.folder, segment)
+        try:
+            with zipfile.ZipFile(f"{path}.tmp", "w", zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+                for seq in seqs:
+                    entry = self._entries[seq]
+                    zf.write(os.path.join(self.folder, entry["name"]), arcname=f"{seq:08d}.jpg")
+            os.replace(f"{path}.tmp", path)
+        except OSError:
+            # the frames are dropped rather than retried, so one bad file can't wedge the writer
+            self.segments -= 1
+            try:
+                os.unlink(f"{path}.tmp")
+            except FileNotFoundError:
+                pass
+            raise
+        with self._lock:
+            for seq in seqs:
+                self._entries[seq]["segment"] = segment
+                self._log({"seq": seq, "segment": segment})
+        for seq in seqs:
+            self._unlink(self._entries[seq])
+
+    def _unlink(self, entry: dict) -> bool:
+        path = os.path.join(self.folder, entry["name"])
+        if self.naming == "content":
+            with self._lock:
+                # a content-named file may have been written again by a newer frame
+                if self._by_name.get(entry["name"]) is not None:
+                    return False
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                return True
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        return True
+
+    # -- lookup ---------------------------------------------------------
+
+    def _entry(self, step: int | None, seq: int | None, run: int | None) -> dict | None:
+        with self._lock:
+            if seq is None:
+                seq = self._by_step.get((self.run if run is None else run, step))
+            return self._entries.get(seq)
+
+    def path(self, step: int | None = None, seq: int | None = None,
+             run: int | None = None) -> str | None:
+        """File of a frame that is still on disk (not yet archived or deleted)."""
+        entry = self._entry(step, seq, run)
+        if entry is None or entry.get("segment"):
+            return None
+        path = os.path.join(self.folder, entry["name"])
+        return path if os.path.exists(path) else None
+
+    def read(self, step: int | None = None, seq: int | None = None,
+             run: int | None = None) -> bytes | None:
+        """Bytes of a frame from disk or its archive segment, or None if it was deleted."""
+        entry = self._entry(step, seq, run)
+        if entry is None:
+            return None
+        if entry.get("segment"):
+            with zipfile.ZipFile(os.path.join(self.folder, entry["segment"])) as zf:
+                return zf.read(f"{entry['seq']:08d}.jpg")
+        try:
+            with open(os.path.join(self.folder, entry["name"]), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def steps(self) -> list[tuple[int, int, int]]:
+        """`(run, step, seq)` for every indexed step, oldest run first."""
+        with self._lock:
+            return sorted((run, step, seq) for (run, step), seq in self._by_step.items())
+
+    # -- index ----------------------------------------------------------
+
+    def _load_index(self) -> None:
+        path = os.path.join(self.folder, INDEX)
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue        # torn last line
+                seq = record.get("seq")
+                if "name" in record:
+                    self._add(record)
+                elif seq in self._entries and "segment" in record:
+                    self._entries[seq]["segment"] = record["segment"]
+                elif seq in self._entries and record.get("evicted"):
+                    self._entries[seq]["evicted"] = True
+                elif seq in self._entries and record.get("deleted"):
+                    self._entries[seq]["deleted"] = True
+                elif "step" in record:
+                    self._by_step[record.get("run", 0), record["step"]] = seq
+        self._ring = deque(seq for seq in sorted(self._entries)
+                           if not self._entries[seq].get("evicted"))
+        self._by_name = {self._entries[seq]["name"]: seq for seq in self._ring}
+        self.disk_bytes = sum(self._entries[seq]["bytes"] for seq in self._ring)
+        # evicted frames still on disk; ones deleted without an archive are gone for good
+        self._unarchived = [seq for seq, e in sorted(self._entries.items())
+                            if e.get("evicted") and not e.get("segment") and not e.get("deleted")
+                            and os.path.exists(os.path.join(self.folder, e["name"]))]
+        segments = {e["segment"] for e in self._entries.values() if e.get("segment")}
+        self.segments = max((int(s[8:14]) for s in segments), default=0)
+        self.seq = max(self._entries, default=-1) + 1
+        self.run = max([e.get("run", 0) for e in self._entries.values()]
+                       + [run for run, _ in self._by_step], default=0)
+
+    def _compact_index(self) -> None:
+        """Rewrite the index with one line per frame and per aliased step."""
+        path = os.path.join(self.folder, INDEX)
+        with open(f"{path}.tmp", "w") as f:
+            for seq in sorted(self._entries):
+                f.write(json.dumps(self._entries[seq], separators=(",", ":")) + "\n")
+            for (run, step), seq in sorted(self._by_step.items()):
+                entry = self._entries[seq]
+                if (entry.get("run", 0), entry.get("step")) != (run, step):
+                    f.write(json.dumps({"run": run, "step": step, "seq": seq},
+                                       separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(f"{path}.tmp", path)
+
+    def close(self) -> None:
+        """Finish pending writes, archive a partial segment and compact the index."""
+        if self.readonly:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        if self.archive and self._unarchived:
+            batch, self._unarchived = self._unarchived, []
+            try:
+                self._write_segment(batch)
+            except OSError as e:
+                print(f"⚠️  Capture store: {e}")
+        self._index.close()
+        self._compact_index()
+        if self.dropped:
+            print(f"⚠️  Capture store dropped {self.dropped} frames")
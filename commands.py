@@ -0,0 +1,186 @@
+import ast
+import json
+import re
+
+from memory import COMMAND_NAMES, command_name
+
+
+def decision_schema(reasoning_chars: int = 0) -> dict:
+    """
+    JSON schema passed as Ollama's `format` for structured decisions.
+
+    `x` and `theta` are magnitudes; the sign comes from `command`.  A short
+    `reasoning` field is only requested when `reasoning_chars` is non-zero.
+    """
+    properties = {
+        "command": {"type": "string", "enum": list(COMMAND_NAMES)},
+        "x": {"type": "number", "minimum": 0, "maximum": 1.0},
+        "theta": {"type": "number", "minimum": 0, "maximum": 90},
+    }
+    required = ["command", "x", "theta"]
+    if reasoning_chars:
+        properties["reasoning"] = {"type": "string", "maxLength": reasoning_chars}
+        required.append("reasoning")
+    return {"type": "object", "properties": properties, "required": required}
+
+
+def parse_freeform(content: str) -> tuple[list, str]:
+    """
+    Parse the three-line REASONING / [x, theta] / COMMAND reply.
+
+    Returns `([x, theta], name)` with theta negated for right turns.  When
+    the last line names a command, that keyword decides the sign, as in
+    `signed_command()`; otherwise any ROTATE_RIGHT in the reply does.
+    """
+    lines = content.splitlines()
+    command_arr = ast.literal_eval(lines[-2])            # [x, theta]
+    if not isinstance(command_arr, (list, tuple)) or len(command_arr) != 2:
+        raise ValueError(f"Expected [x, theta], got {lines[-2]!r}")
+    command_arr = list(command_arr)
+    if any(name in lines[-1].upper() for name in COMMAND_NAMES):
+        name = command_name(command_arr, lines[-1])
+        return signed_command(name, *command_arr), name
+
+    # no keyword line: fall back to searching the whole reply for a right turn
+    reasoning = "\n".join(lines[0:]).upper()
+    if "ROTATE_RIGHT" in reasoning and command_arr[1] > 0:
+        command_arr[1] = -command_arr[1]
+    return command_arr, command_name(command_arr, lines[-1])
+
+
+def signed_command(name: str, x: float, theta: float) -> list:
+    """
+    Turn a command keyword and magnitudes into `[x, theta]`.
+
+    The keyword alone decides which component is used and its sign, so a
+    stray non-zero `theta` on a forward move is ignored.
+    """
+    x, theta = abs(float(x)), abs(float(theta))
+    if name == "MOVE_FORWARD":
+        return [x, 0]
+    if name == "MOVE_BACKWARD":
+        return [-x, 0]
+    if name == "ROTATE_LEFT":
+        return [0, theta]
+    if name == "ROTATE_RIGHT":
+        return [0, -theta]
+    raise RuntimeError(f"Unknown command in decision: {name!r}")
+
+
+def parse_structured(content: str) -> tuple[list, str]:
+    """Parse a reply constrained by `decision_schema()`."""
+    try:
+        decision = json.loads(content)
+        name = decision["command"]
+        return signed_command(name, decision["x"], decision["theta"]), name
+    except (ValueError, KeyError, TypeError) as e:
+        raise RuntimeError(f"Malformed decision: {content!r}") from e
+
+
+def plan_schema(max_steps: int = 4) -> dict:
+    """JSON schema for a short sequence of decisions executed back-to-back."""
+    return {
+        "type": "object",
+        "properties": {
+            "plan": {"type": "array", "items": decision_schema(),
+                     "minItems": 1, "maxItems": max_steps},
+        },
+        "required": ["plan"],
+    }
+
+
+_PLAN_STEP_RE = re.compile(r"(" + "|".join(COMMAND_NAMES) + r")\s*\(\s*(\d*\.?\d+)\s*\)")
+_PLAN_CALL_RE = re.compile(r"(?:" + "|".join(COMMAND_NAMES) + r")\s*\(")
+
+
+def parse_plan(content: str, structured: bool = False) -> list[tuple[list, str]]:
+    """
+    Parse a plan reply into `[([x, theta], name), ...]`.
+
+    Text plans are a `PLAN:` line of semicolon-separated calls such as
+    `MOVE_FORWARD(0.8); ROTATE_LEFT(45)`, and a reply without one is
+    rejected; structured plans follow
+    `plan_schema()`.
+    """
+    if structured:
+        try:
+            steps = json.loads(content)["plan"]
+            return [(signed_command(s["command"], s["x"], s["theta"]), s["command"]) for s in steps]
+        except (ValueError, KeyError, TypeError) as e:
+            raise RuntimeError(f"Malformed plan: {content!r}") from e
+
+    lines = [line for line in content.splitlines() if line.upper().startswith("PLAN:")]
+    if not lines:
+        # the reasoning may mention commands the model decided against
+        raise RuntimeError(f"No PLAN: line in reply: {content!r}")
+    text = lines[0].upper()
+    steps = _PLAN_STEP_RE.findall(text)
+    if len(steps) != len(_PLAN_CALL_RE.findall(text)):
+        # dropping a step silently would run the rest of the plan from the wrong pose
+        raise RuntimeError(f"Unparseable step in plan: {content!r}")
+    plan = []
+    for name, amount in steps:
+        if name.startswith("ROTATE"):
+            plan.append((signed_command(name, 0, amount), name))
+        else:
+            plan.append((signed_command(name, amount, 0), name))
+    if not plan:
+        raise RuntimeError(f"No commands in plan: {content!r}")
+    return plan
+
+
+_JSON_FIELD_RES = {
+    "command": re.compile(r'"command"\s*:\s*"([A-Z_]+)"'),
+    "x": re.compile(r'"x"\s*:\s*(-?\d+(?:\.\d+)?)\s*[,}\s]'),
+    "theta": re.compile(r'"theta"\s*:\s*(-?\d+(?:\.\d+)?)\s*[,}\s]'),
+}
+
+
+class StreamCommandParser:
+    """
+    Incremental parser that spots the command in a streamed reply.
+
+    Feed it content chunks as they arrive; `feed()` returns
+    `([x, theta], name)` as soon as the command is complete and `None`
+    until then.  In text mode the reply must lead with the `[x, theta]`
+    line followed by the command keyword line (reasoning afterwards); in
+    json mode the three schema fields must have been closed.
+    """
+
+    def __init__(self, structured: bool = False):
+        self.structured = structured
+        self.text = ""
+
+    def feed(self, chunk: str) -> tuple[list, str] | None:
+        self.text += chunk
+        if self.structured:
+            return self._from_json()
+        return self._from_lines()
+
+    def _from_lines(self):
+        # a line is only complete once the newline after it has arrived
+        lines = [line.strip() for line in self.text.split("\n")[:-1]]
+        lines = [line for line in lines if line]
+        if len(lines) < 2:
+            return None
+        try:
+            return parse_freeform("\n".join(lines[:2]))
+        except (ValueError, SyntaxError, TypeError):
+            # the model led with something else; wait for the full reply
+            return None
+
+    def _from_json(self):
+        found = {}
+        for field, pattern in _JSON_FIELD_RES.items():
+            match = pattern.search(self.text)
+            if match is None:
+                return None
+            found[field] = match.group(1)
+        return parse_structured(json.dumps(
+            {"command": found["command"], "x": float(found["x"]), "theta": float(found["theta"])}))
+
+    def finish(self) -> tuple[list, str]:
+        """Parse the complete reply once the stream has ended."""
+        if self.structured:
+            return parse_structured(self.text)
+        return self.feed("\n") or parse_freeform(self.text.strip())
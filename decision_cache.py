@@ -0,0 +1,100 @@
+import hashlib
+import io
+from collections import OrderedDict
+
+from PIL import Image
+
+
+def dhash(image: str | bytes, size: int = 8) -> int:
+    """
+    Difference hash of a frame: `size * size` bits, one per horizontally
+    adjacent pixel pair of a tiny greyscale thumbnail.  Near-identical
+    scenes differ in only a few bits, unlike a byte hash of the JPEG.
+    """
+    img = Image.open(image if isinstance(image, str) else io.BytesIO(image))
+    # let the JPEG decoder downscale while decoding instead of at full size
+    img.draft("L", (size * 8, size * 8))
+    pixels = list(img.convert("L").resize((size + 1, size), Image.BILINEAR).getdata())
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return bits
+
+
+class DecisionCache:
+    """
+    LRU cache of model decisions for scenes that have not materially changed.
+
+    An entry is keyed on the frame's `dhash`, the distance reading rounded
+    to `quantum` metres and a digest of the rest of the prompt (task,
+    memory, mode).  A lookup hits when the reading and prompt match exactly
+    and the frame is within `max_distance` differing hash bits.  An entry
+    is dropped after `max_reuse` hits so a robot that stays stuck is
+    eventually asked about again.  When a reused decision is recorded in
+    the memory, `follow()` moves its entry to the new prompt digest.
+    """
+
+    def __init__(self, capacity: int = 64, max_distance: int = 6,
+                 quantum: float = 0.1, max_reuse: int = 3):
+        self.capacity = capacity
+        self.max_distance = max_distance
+        self.quantum = quantum
+        self.max_reuse = max_reuse
+        self.hits = 0
+        self.misses = 0
+        # (sensor bucket, prompt digest, frame hash) -> [command_arr, name, hits]
+        self._entries: OrderedDict = OrderedDict()
+        self._last_hit: tuple | None = None
+
+    def fingerprint(self, image: str | bytes, distance: float) -> tuple[int, int]:
+        """`(frame hash, quantized distance)` for one sensed step."""
+        return dhash(image), int(round(distance / self.quantum))
+
+    @staticmethod
+    def digest(prompt_state: str) -> str:
+        return hashlib.blake2b(prompt_state.encode(), digest_size=16).hexdigest()
+
+    def get(self, fingerprint: tuple[int, int], prompt_state: str) -> tuple[list, str] | None:
+        """Cached `(command_arr, name)` for a similar scene, or None."""
+        frame, bucket = fingerprint
+        digest = self.digest(prompt_state)
+        best, best_bits = None, self.max_distance + 1
+        for key in self._entries:
+            if key[0] == bucket and key[1] == digest:
+                bits = (key[2] ^ frame).bit_count()
+                if bits < best_bits:
+                    best, best_bits = key, bits
+        self._last_hit = best
+        if best is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        entry = self._entries[best]
+        entry[2] += 1
+        if entry[2] >= self.max_reuse:
+            del self._entries[best]
+        else:
+            self._entries.move_to_end(best)
+        return list(entry[0]), entry[1]
+
+    def follow(self, prompt_state: str) -> None:
+        """Re-key the entry `get()` just returned under the prompt its reuse led to."""
+        key, self._last_hit = self._last_hit, None
+        if key is None or key not in self._entries:
+            return
+        self._entries[(key[0], self.digest(prompt_state), key[2])] = self._entries.pop(key)
+
+    def put(self, fingerprint: tuple[int, int], prompt_state: str,
+            command_arr: list, name: str) -> None:
+        frame, bucket = fingerprint
+        key = (bucket, self.digest(prompt_state), frame)
+        self._entries[key] = [list(command_arr), name, 0]
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
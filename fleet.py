@@ -0,0 +1,311 @@
+"""
+Run several robots from one host against a single inference backend.
+
+Each robot gets a `RobotSession` with its own client, memory, pose and
+metrics; an `InferenceScheduler` multiplexes their model calls onto the
+backend:
+
+    python fleet.py --robot r1=http://192.168.4.1:5000 --robot r2=http://192.168.4.2:5000 --steps 20
+    python fleet.py --sim 4 --mock 40 --steps 10 --yes    # simulated robots and model
+
+As in `run_ollama.py`, every move waits for the operator's y/n unless
+`--yes` is given, and `--safety` puts a `SafetyMonitor` in front of each
+robot's motors.
+"""
+import argparse
+import asyncio
+import contextlib
+import heapq
+import itertools
+import os
+import statistics
+import threading
+import time
+
+from backends import OllamaBackend, TransformersEngine, keep_alive_value
+from commands import parse_freeform
+from memory import ConversationMemory
+from metrics import MetricsRecorder, StepMetrics
+from robot_client import RobotClient
+from run_ollama import MODEL, SYSTEM_PROMPT, Pose, build_user_prompt
+
+# one robot at a time gets the terminal for its y/n prompt
+_prompt_lock = threading.Lock()
+
+
+class RobotSession:
+    """
+    Mission state for one robot: what `run_ollama.py` keeps in module
+    globals, so any number of robots can share a process.
+
+    A session is at collision risk while its last centre reading is below
+    `risk_distance`; its model calls then jump the scheduler queue.  Moves
+    are confirmed by the operator unless `auto_confirm`, and with `safety`
+    a `SafetyMonitor` clamps, vetoes and aborts them from live readings.
+    """
+
+    def __init__(self, name: str, url: str, metrics_path: str | None = None,
+                 risk_distance: float = 0.7, auto_confirm: bool = False,
+                 safety: bool = False):
+        self.name = name
+        self.client = RobotClient(url)
+        self.auto_confirm = auto_confirm
+        self.sampler = None
+        self.safety = None
+        if safety:
+            from safety import SafetyMonitor
+            from sensors import SensorSampler
+            self.sampler = SensorSampler(self.client).start()
+            self.sampler.wait_ready()
+            self.safety = SafetyMonitor(self.client, self.sampler)
+        self.memory = ConversationMemory()
+        self.pose = Pose()
+        self.metrics = MetricsRecorder(metrics_path)
+        self.risk_distance = risk_distance
+        self.distance = float("inf")
+        self.steps = 0
+        self.failures = 0          # consecutive steps that ended in an error
+        self.served = 0            # inferences granted so far, for fair queuing
+        self.queue_waits: list[float] = []
+        self.inferences: list[float] = []
+
+    @property
+    def at_risk(self) -> bool:
+        return self.distance < self.risk_distance
+
+    def messages(self, frame: bytes, distance: float) -> list:
+        prompt = build_user_prompt(distance - 0.5, self.memory)
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt, "images": [frame]},
+        ]
+
+    def confirm(self, command_arr: list, name: str) -> bool:
+        """Ask the operator to approve a move (always granted with `auto_confirm`)."""
+        if self.auto_confirm:
+            return True
+        with _prompt_lock:
+            return input(f"{self.name}: proceed with {name} {command_arr}? y|n ").strip().lower() == "y"
+
+    def move(self, command_arr: list) -> dict | None:
+        """Send a move and wait for it to finish; None if the safety layer vetoed it."""
+        watch = contextlib.nullcontext()
+        if self.safety is not None:
+            checked, reason = self.safety.check(command_arr)
+            if checked is None:
+                print(f"🛑  {self.name}: vetoed {command_arr}: {reason}")
+                return None
+            if checked != command_arr:
+                print(f"⚠️  {self.name}: safety {reason}")
+            command_arr = checked
+            watch = self.safety.watching(command_arr)
+        x, theta = command_arr
+        with watch:
+            sent = time.monotonic()
+            reply = self.client.move(x, theta)
+            reply = self.client.wait_for_motion(x, theta, reply, sent)
+        if reply.get("status") == "stopped":
+            command_arr = [reply.get("x", x), theta]
+        self.pose.update(command_arr)
+        return reply
+
+    def stats(self) -> str:
+        def p50(values):
+            return statistics.median(values) * 1000 if values else 0.0
+        return (f"{self.name}: {self.metrics.summary()}; "
+                f"queue wait p50 {p50(self.queue_waits):.0f} ms (max {max(self.queue_waits, default=0) * 1000:.0f}), "
+                f"inference p50 {p50(self.inferences):.0f} ms")
+
+    def close(self) -> None:
+        if self.sampler is not None:
+            self.sampler.close()
+        self.metrics.close()
+        self.client.close()
+
+
+class InferenceScheduler:
+    """
+    Shares one backend between sessions.
+
+    Requests wait in a heap ordered by (collision risk first, fewest
+    inferences served, arrival), so every robot gets its turn and a robot
+    about to hit something is served next.  `concurrency` requests run
+    at once, each on a worker thread; keep it at 1 for a single Ollama
+    server, or raise it to let a batching backend fill its batches.
+    """
+
+    def __init__(self, backend, concurrency: int = 1, model: str = MODEL):
+        self.backend = backend
+        self.model = model
+        self.concurrency = concurrency
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._ready: asyncio.Condition | None = None
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._ready = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def infer(self, session: RobotSession, messages: list, step: StepMetrics):
+        """Queue a chat request for `session` and wait for the reply."""
+        future = asyncio.get_running_loop().create_future()
+        entry = (0 if session.at_risk else 1, session.served, next(self._seq),
+                 time.perf_counter(), session, messages, step, future)
+        async with self._ready:
+            heapq.heappush(self._heap, entry)
+            self._ready.notify()
+        return await future
+
+    async def _worker(self) -> None:
+        while True:
+            async with self._ready:
+                await self._ready.wait_for(lambda: self._heap)
+                _, _, _, queued, session, messages, step, future = heapq.heappop(self._heap)
+            session.served += 1
+            started = time.perf_counter()
+            session.queue_waits.append(started - queued)
+            step.set("queue_ms", round((started - queued) * 1000, 2))
+            try:
+                with step.span("inference"):
+                    response = await asyncio.to_thread(self.backend, model=self.model, messages=messages)
+            except Exception as e:
+                future.set_exception(e)
+                continue
+            session.inferences.append(time.perf_counter() - started)
+            future.set_result(response)
+
+
+async def run_session(session: RobotSession, scheduler: InferenceScheduler,
+                      max_steps: int | None = None, max_failures: int = 3) -> int:
+    """
+    Perceive → infer → act for one robot until it stops or `max_steps` moves.
+
+    A failed sensor read, model call or unparseable reply only costs this
+    robot its step; after `max_failures` in a row its session ends, while
+    the rest of the fleet carries on.
+    """
+    while max_steps is None or session.steps < max_steps:
+        step = session.metrics.start_step()
+        step.set("robot", session.name)
+        try:
+            frame, distance = await asyncio.to_thread(session.client.sense, timer=step)
+            session.distance = distance
+            step.set("at_risk", session.at_risk)
+            response = await scheduler.infer(session, session.messages(frame, distance), step)
+            step.add_ollama(response)
+            with step.span("parse"):
+                command_arr, name = parse_freeform(response.message.content)
+        except Exception as e:
+            # robot HTTP errors, ollama's ConnectionError/ResponseError and bad replies alike
+            session.failures += 1
+            step.set("error", str(e))
+            session.metrics.emit(step)
+            print(f"⚠️  {session.name}: step failed ({session.failures}/{max_failures}): {e}")
+            if session.failures >= max_failures:
+                print(f"🛑  {session.name}: giving up after {max_failures} failed steps")
+                break
+            continue
+        session.failures = 0
+        step.set("command", command_arr)
+        if not any(command_arr):
+            session.memory.add(command_arr, name, distance)
+            session.metrics.emit(step)
+            print(f"🏁  {session.name}: {name}, session finished")
+            break
+        if not await asyncio.to_thread(step.timed, "confirm", session.confirm, command_arr, name):
+            print(f"🏁  {session.name}: {name} declined, session finished")
+            session.metrics.emit(step)
+            break
+        session.memory.add(command_arr, name, distance)
+        try:
+            await asyncio.to_thread(step.timed, "move", session.move, command_arr)
+        except RuntimeError as e:
+            print(f"⚠️  {session.name}: {e}")
+        session.steps += 1
+        session.metrics.emit(step)
+    return session.steps
+
+
+async def run_fleet(sessions: list[RobotSession], scheduler: InferenceScheduler,
+                    max_steps: int | None = None) -> list[int]:
+    await scheduler.start()
+    try:
+        results = await asyncio.gather(*(run_session(s, scheduler, max_steps) for s in sessions),
+                                       return_exceptions=True)
+    finally:
+        await scheduler.stop()
+    done = []
+    for session, result in zip(sessions, results):
+        if isinstance(result, BaseException):
+            # anything run_session did not expect still only ends that robot
+            print(f"⚠️  {session.name}: session failed: {result!r}")
+            result = session.steps
+        done.append(result)
+    return done
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive several robots from one inference backend")
+    parser.add_argument("--robot", action="append", default=[], metavar="NAME=URL",
+                        help="robot to drive (repeat for each robot)")
+    parser.add_argument("--sim", type=int, default=0, help="also start this many simulated robots")
+    parser.add_argument("--mock", type=float, default=0.0, metavar="TOK_S",
+                        help="use the mock model at this many tokens/s instead of a real backend")
+    parser.add_argument("--backend", choices=["ollama", "transformers"], default="ollama")
+    parser.add_argument("--keep-alive", default=None, type=keep_alive_value,
+                        help="Ollama keep_alive, e.g. 30m, or seconds (-1 = forever)")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="model requests in flight at once")
+    parser.add_argument("--steps", type=int, default=None, help="stop each robot after this many moves")
+    parser.add_argument("--risk-distance", type=float, default=0.7,
+                        help="robots closer than this (m) to an obstacle are served first")
+    parser.add_argument("--metrics-dir", default=None, help="write <robot>.jsonl step metrics here")
+    parser.add_argument("--yes", action="store_true",
+                        help="execute commands without asking for confirmation")
+    parser.add_argument("--safety", action="store_true",
+                        help="clamp/veto forward moves and stop in-flight moves from live distance readings")
+    args = parser.parse_args()
+
+    robots = [spec.split("=", 1) for spec in args.robot]
+    sims = []
+    if args.sim:
+        from sim_robot import SimRobot
+        sims = [SimRobot(seed=i).start() for i in range(args.sim)]
+        robots += [(f"sim{i}", sim.url) for i, sim in enumerate(sims)]
+    if not robots:
+        parser.error("give at least one --robot NAME=URL or --sim N")
+
+    if args.mock:
+        from mock_llm import MockChat
+        backend = MockChat(args.mock, prompt_rate=20 * args.mock)
+    elif args.backend == "transformers":
+        backend = TransformersEngine(max_batch=args.concurrency)
+    else:
+        backend = OllamaBackend(keep_alive=args.keep_alive)
+
+    if args.metrics_dir:
+        os.makedirs(args.metrics_dir, exist_ok=True)
+    sessions = [RobotSession(name, url, risk_distance=args.risk_distance,
+                             auto_confirm=args.yes, safety=args.safety,
+                             metrics_path=os.path.join(args.metrics_dir, f"{name}.jsonl") if args.metrics_dir else None)
+                for name, url in robots]
+    scheduler = InferenceScheduler(backend, args.concurrency)
+    started = time.perf_counter()
+    try:
+        done = asyncio.run(run_fleet(sessions, scheduler, args.steps))
+        elapsed = time.perf_counter() - started
+        print(f"⏱️  {sum(done)} moves by {len(sessions)} robots in {elapsed:.1f} s")
+    finally:
+        for session in sessions:
+            print("📈 ", session.stats())
+            session.close()
+        if isinstance(backend, TransformersEngine):
+            backend.close()
+        for sim in sims:
+            sim.stop()
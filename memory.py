@@ -0,0 +1,106 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+
+# Rough size of a Gemma token for English/numeric text; good enough to keep
+# the memory block under budget without loading a tokenizer.
+CHARS_PER_TOKEN = 4
+
+COMMAND_NAMES = ("MOVE_FORWARD", "MOVE_BACKWARD", "ROTATE_LEFT", "ROTATE_RIGHT")
+_COMMAND_RE = re.compile("|".join(COMMAND_NAMES))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def command_name(command_arr: list, text: str = "") -> str:
+    """Pick the command keyword from the model's text, falling back to the array."""
+    found = _COMMAND_RE.findall(text.upper())
+    if found:
+        return found[-1]
+    x, theta = command_arr
+    if x:
+        return "MOVE_FORWARD" if x > 0 else "MOVE_BACKWARD"
+    if theta:
+        return "ROTATE_LEFT" if theta > 0 else "ROTATE_RIGHT"
+    return "STAY"
+
+
+@dataclass
+class CommandRecord:
+    step: int
+    name: str
+    x: float
+    theta: float
+    distance: float
+
+    def render(self) -> str:
+        if self.name.startswith("ROTATE"):
+            arg = f"{abs(self.theta):g}°"
+        else:
+            arg = f"{abs(self.x):.2f} m"
+        return f"{self.step}. {self.name} {arg} (clearance {self.distance:.2f} m)"
+
+
+class ConversationMemory:
+    """
+    Token-budgeted record of the commands issued during a mission.
+
+    Only one short line per command is kept.  The block is append-only, so
+    consecutive prompts share everything up to the newest line and Ollama
+    can reuse its cached prefix.  When the block grows past
+    `token_budget`, the oldest `chunk` records are folded into a one-line
+    summary (or dropped when `summarize` is off); this rewrites the prefix
+    only once per chunk instead of on every step.
+    """
+
+    def __init__(self, token_budget: int = 400, summarize: bool = True, chunk: int = 8):
+        self.token_budget = token_budget
+        self.summarize = summarize
+        self.chunk = chunk
+        self.records: list[CommandRecord] = []
+        self.steps = 0
+        self._folded = Counter()
+        self._folded_amount = Counter()
+        self._folded_steps = 0
+
+    def add(self, command_arr: list, name: str, distance: float) -> CommandRecord:
+        self.steps += 1
+        record = CommandRecord(self.steps, name, command_arr[0], command_arr[1], distance)
+        self.records.append(record)
+        while len(self.records) > 1 and self.tokens() > self.token_budget:
+            self._compact()
+        return record
+
+    def _compact(self) -> None:
+        old = self.records[:self.chunk]
+        self.records = self.records[self.chunk:]
+        if not self.summarize:
+            return
+        for record in old:
+            self._folded[record.name] += 1
+            if record.name.startswith("ROTATE"):
+                self._folded_amount[record.name] += abs(record.theta)
+            else:
+                self._folded_amount[record.name] += abs(record.x)
+        self._folded_steps += len(old)
+
+    def summary(self) -> str:
+        if not self._folded_steps:
+            return ""
+        parts = []
+        for name in COMMAND_NAMES:
+            if self._folded[name]:
+                unit = "°" if name.startswith("ROTATE") else " m"
+                parts.append(f"{self._folded[name]}× {name} "
+                             f"({self._folded_amount[name]:g}{unit} total)")
+        return f"Steps 1-{self._folded_steps}: " + ", ".join(parts)
+
+    def render(self) -> str:
+        lines = [self.summary()] if self._folded_steps else []
+        lines += [record.render() for record in self.records]
+        return "\n".join(lines) if lines else "none yet"
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.render())
@@ -0,0 +1,165 @@
+import json
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+# Timing and token fields reported by Ollama on the final ChatResponse.
+# Durations are in nanoseconds.
+OLLAMA_FIELDS = ("prompt_eval_count", "prompt_eval_duration",
+                 "eval_count", "eval_duration", "load_duration", "total_duration")
+# Spans spent waiting for the operator.  They stay in "spans" but are left
+# out of the step total, so step latency does not measure reaction time.
+OPERATOR_SPANS = ("confirm",)
+
+
+class StepMetrics:
+    """Per-stage timings for one perceive → infer → act step."""
+
+    def __init__(self, step: int):
+        self.step = step
+        self.started = time.perf_counter()
+        self.record = {"step": step, "ts": time.time(), "spans": {}, "ollama": {}}
+        self._lock = threading.Lock()
+        self._background = 0
+        self._on_done = None
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a stage; repeated spans with the same name within a step add up."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            spans = self.record["spans"]
+            spans[name] = round(spans.get(name, 0.0) + (time.perf_counter() - t0) * 1000, 2)
+
+    def timed(self, name: str, fn, *args, **kwargs):
+        with self.span(name):
+            return fn(*args, **kwargs)
+
+    def add_ollama(self, response) -> None:
+        for field in OLLAMA_FIELDS:
+            value = getattr(response, field, None)
+            if value is not None:
+                self.record["ollama"][field] = value
+
+    def set(self, key: str, value) -> None:
+        self.record[key] = value
+
+    def background(self, name: str, fn, *args) -> None:
+        """Run `fn` on a thread that still belongs to this step, e.g. draining a stream."""
+        with self._lock:
+            self._background += 1
+        threading.Thread(target=self._run_background, args=(fn, args),
+                         name=name, daemon=True).start()
+
+    def _run_background(self, fn, args) -> None:
+        try:
+            fn(*args)
+        finally:
+            with self._lock:
+                self._background -= 1
+                done = self._on_done if self._background == 0 else None
+                if done:
+                    self._on_done = None
+            if done:
+                done()
+
+    def when_done(self, callback) -> None:
+        """Call `callback` now, or once the step's background work has finished."""
+        with self._lock:
+            if self._background:
+                self._on_done = callback
+                return
+        callback()
+
+
+class MetricsRecorder:
+    """
+    Collects `StepMetrics` and writes one JSON line per finished step.
+
+    With `serve_prometheus()` the same data is exported as histograms so
+    p50/p99 step and stage latency can be scraped across the fleet.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path
+        self.totals: list[float] = []
+        self._steps = 0
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1) if path else None
+        self._prom = None
+        self._writing = 0
+        self._written = threading.Condition(self._lock)
+
+    def start_step(self) -> StepMetrics:
+        with self._lock:
+            self._steps += 1
+            return StepMetrics(self._steps)
+
+    def emit(self, step: StepMetrics) -> None:
+        """
+        Finish a step.  Its timings are taken now; the record is written once
+        any `StepMetrics.background()` work has added its counters too.
+        """
+        waited = sum(step.record["spans"].get(name, 0.0) for name in OPERATOR_SPANS) / 1000
+        total = time.perf_counter() - step.started - waited
+        step.record["total_ms"] = round(total * 1000, 2)
+        with self._lock:
+            self.totals.append(total)
+            self._writing += 1
+        step.when_done(lambda: self._write(step.record, total))
+
+    def _write(self, record: dict, total: float) -> None:
+        line = json.dumps(record)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+        if self._prom is not None:
+            self._observe(record, total)
+        with self._lock:
+            self._writing -= 1
+            self._written.notify_all()
+
+    def serve_prometheus(self, port: int) -> None:
+        try:
+            import prometheus_client
+        except ImportError as e:
+            raise RuntimeError("prometheus_client is needed for the metrics endpoint") from e
+
+        self._prom = {
+            "step": prometheus_client.Histogram(
+                "robot_step_seconds", "Wall time of one control-loop step"),
+            "stage": prometheus_client.Histogram(
+                "robot_stage_seconds", "Wall time of one stage of a step", ["stage"]),
+            "tokens": prometheus_client.Counter(
+                "robot_llm_tokens_total", "Tokens processed by the model", ["kind"]),
+        }
+        prometheus_client.start_http_server(port)
+        print(f"📈  Prometheus metrics on :{port}/metrics")
+
+    def _observe(self, record: dict, total: float) -> None:
+        self._prom["step"].observe(total)
+        for stage, ms in record["spans"].items():
+            self._prom["stage"].labels(stage).observe(ms / 1000)
+        ollama = record["ollama"]
+        for kind, field in (("prompt", "prompt_eval_count"), ("generated", "eval_count")):
+            if field in ollama:
+                self._prom["tokens"].labels(kind).inc(ollama[field])
+
+    def summary(self) -> str:
+        if not self.totals:
+            return "no steps recorded"
+        ms = sorted(t * 1000 for t in self.totals)
+        p99 = ms[min(len(ms) - 1, int(round(0.99 * (len(ms) - 1))))]
+        return (f"{len(ms)} steps, p50 {statistics.median(ms):.0f} ms, "
+                f"p99 {p99:.0f} ms, max {ms[-1]:.0f} ms")
+
+    def close(self, timeout: float = 30.0) -> None:
+        """Wait up to `timeout` s for records still waiting on background work, then close."""
+        with self._lock:
+            self._written.wait_for(lambda: self._writing == 0, timeout)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
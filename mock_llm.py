@@ -0,0 +1,149 @@
+"""
+Mock chat backend with a configurable token rate.
+
+`MockChat` is a drop-in for `ollama.chat` that answers the NavPilot prompts
+with plausible commands, takes as long as a model with the given prompt and
+generation throughput would, and fills in the same counters Ollama reports.
+"""
+import json
+import random
+import re
+import time
+
+from ollama import ChatResponse, Message
+
+# Gemma 3 spends a fixed 256 tokens on each image
+IMAGE_TOKENS = 256
+CHARS_PER_TOKEN = 4
+
+_DISTANCE_RE = re.compile(r"closest object is (-?\d+(?:\.\d+)?) meters")
+_FILLER = ("the", "floor", "ahead", "looks", "clear", "and", "a", "table", "is",
+           "visible", "on", "left", "side", "so", "I", "will", "keep", "exploring")
+
+
+class MockChat:
+    """
+    Callable with the `ollama.chat` signature.
+
+    `prompt_rate` and `token_rate` are tokens per second for prompt
+    evaluation and generation; `load_time` is paid on the first call.  Like
+    Ollama, a prompt that shares a prefix with the previous one is only
+    charged for the tokens after the shared prefix.
+    """
+
+    def __init__(self, token_rate: float = 20.0, prompt_rate: float = 400.0,
+                 load_time: float = 0.0, reasoning_tokens: int = 80, seed: int = 0):
+        self.token_rate = token_rate
+        self.prompt_rate = prompt_rate
+        self.load_time = load_time
+        self.reasoning_tokens = reasoning_tokens
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self._loaded = False
+        self._last_prompt = ""
+
+    def __call__(self, model: str = "", messages=None, *, stream: bool = False,
+                 format=None, options=None, keep_alive=None, **kwargs):
+        messages = list(messages or [])
+        load = 0.0
+        if not self._loaded:
+            load = self.load_time
+            self._loaded = True
+        prompt_tokens = self._prompt_tokens(messages)
+        limit = (options or {}).get("num_predict")
+        tokens = self._reply_tokens(messages, format, limit)
+        self.calls += 1
+        if stream:
+            return self._stream(model, tokens, prompt_tokens, load)
+
+        prompt_time = prompt_tokens / self.prompt_rate
+        eval_time = len(tokens) / self.token_rate
+        time.sleep(load + prompt_time + eval_time)
+        return self._response(model, "".join(tokens), True, prompt_tokens,
+                              len(tokens), load, prompt_time, eval_time)
+
+    def _stream(self, model, tokens, prompt_tokens, load):
+        prompt_time = prompt_tokens / self.prompt_rate
+        time.sleep(load + prompt_time)
+        for token in tokens:
+            time.sleep(1.0 / self.token_rate)
+            yield self._response(model, token, False)
+        yield self._response(model, "", True, prompt_tokens, len(tokens), load,
+                             prompt_time, len(tokens) / self.token_rate)
+
+    @staticmethod
+    def _response(model, content, done, prompt_tokens=None, eval_tokens=None,
+                  load=0.0, prompt_time=0.0, eval_time=0.0) -> ChatResponse:
+        fields = {}
+        if done:
+            fields = {
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_time * 1e9),
+                "eval_count": eval_tokens,
+                "eval_duration": int(eval_time * 1e9),
+                "load_duration": int(load * 1e9),
+                "total_duration": int((load + prompt_time + eval_time) * 1e9),
+                "done_reason": "stop",
+            }
+        return ChatResponse(model=model, done=done,
+                            message=Message(role="assistant", content=content), **fields)
+
+    def _prompt_tokens(self, messages) -> int:
+        text = "".join(str(m.get("content", "")) for m in messages)
+        images = sum(len(m.get("images") or []) for m in messages)
+        shared = 0
+        for a, b in zip(text, self._last_prompt):
+            if a != b:
+                break
+            shared += 1
+        self._last_prompt = text
+        return (len(text) - shared) // CHARS_PER_TOKEN + 1 + images * IMAGE_TOKENS
+
+    def _decide(self, messages) -> tuple[str, float, float]:
+        user = next((m for m in reversed(messages) if m.get("role") == "user"), {})
+        match = _DISTANCE_RE.search(str(user.get("content", "")))
+        free = float(match.group(1)) if match else 1.0
+        if free >= 0.5:
+            return "MOVE_FORWARD", round(min(free, 1.0), 2), 0
+        return self.rng.choice(("ROTATE_LEFT", "ROTATE_RIGHT")), 0, 45
+
+    def _plan(self, messages, max_steps: int) -> list[tuple[str, float, float]]:
+        """Forward moves of at most 0.6 m into the free space, then a turn for a new view."""
+        name, free, theta = self._decide(messages)
+        plan = []
+        while name == "MOVE_FORWARD" and free >= 0.1 and len(plan) < max_steps - 1:
+            x = round(min(free, 0.6), 2)
+            plan.append(("MOVE_FORWARD", x, 0))
+            free -= x
+        plan.append((self.rng.choice(("ROTATE_LEFT", "ROTATE_RIGHT")), 0, 45))
+        return plan
+
+    def _reasoning(self, n: int) -> str:
+        return " ".join(self.rng.choice(_FILLER) for _ in range(n))
+
+    def _reply_tokens(self, messages, format, limit) -> list[str]:
+        name, x, theta = self._decide(messages)
+        system = str(messages[0].get("content", "")) if messages else ""
+        if isinstance(format, dict) and "plan" in format.get("properties", {}):
+            plan = self._plan(messages, format["properties"]["plan"].get("maxItems", 4))
+            text = json.dumps({"plan": [{"command": n, "x": x, "theta": t} for n, x, t in plan]})
+        elif "PLAN:" in system:
+            plan = self._plan(messages, 4)
+            text = (f"REASONING: {self._reasoning(self.reasoning_tokens)}\n"
+                    "PLAN: " + "; ".join(f"{n}({x or t})" for n, x, t in plan))
+        elif isinstance(format, dict):
+            decision = {"command": name, "x": x, "theta": theta}
+            if "reasoning" in format.get("properties", {}):
+                cap = format["properties"]["reasoning"].get("maxLength", 80)
+                decision["reasoning"] = self._reasoning(self.reasoning_tokens)[:cap]
+            text = json.dumps(decision)
+        elif "3. REASONING" in system:
+            text = f"[{x},{theta}]\n{name}\nREASONING: {self._reasoning(self.reasoning_tokens)}"
+        else:
+            text = f"REASONING: {self._reasoning(self.reasoning_tokens)}\n[{x},{theta}]\n{name}"
+        # split into roughly token-sized pieces, keeping separators attached
+        tokens = re.findall(r"\S+\s*|\s+", text)
+        tokens = [piece for token in tokens
+                  for piece in (token[i:i + CHARS_PER_TOKEN * 2]
+                                for i in range(0, len(token), CHARS_PER_TOKEN * 2))]
+        return tokens[:limit] if limit else tokens
@@ -0,0 +1,134 @@
+import math
+from typing import Dict
+
+import numpy as np
+
+# Log-odds increments, in int8 units, for a cell a ray passed through and
+# for the cell it ended in.  Cells saturate at +/-LOG_ODDS_MAX.
+LOG_ODDS_FREE = -4
+LOG_ODDS_OCCUPIED = 12
+LOG_ODDS_MAX = 120
+OCCUPIED_THRESHOLD = 20
+
+
+class OccupancyGrid:
+    """
+    Log-odds occupancy grid in a compact int8 array.
+
+    Angles follow the robot's convention: headings in degrees, 0 = the
+    initial forward direction, positive = counter-clockwise (left).  Each
+    multi-angle distance reading is ray-cast from the pose in one batch of
+    array operations, and the grid grows by doubling whenever a ray leaves
+    the mapped area, so updates only touch the cells the rays cover.  A
+    separate boolean mask records which cells any ray has observed, so
+    unexplored space is reported as unknown rather than free.
+    """
+
+    def __init__(self, resolution: float = 0.05, size: float = 8.0, max_range: float = 4.0):
+        self.resolution = resolution
+        self.max_range = max_range
+        cells = int(math.ceil(size / resolution))
+        self.grid = np.zeros((cells, cells), dtype=np.int8)
+        self.seen = np.zeros((cells, cells), dtype=bool)
+        # (column, row) of the cell holding world (0, 0); an integer, so
+        # growing the grid never moves a point into a neighbouring cell
+        self.offset = np.array([cells // 2, cells // 2], dtype=np.int64)
+        self.updates = 0
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.grid.shape
+
+    def _ensure_contains(self, points: np.ndarray) -> None:
+        while not np.all(self._inside(self._index(points))):
+            self._grow()
+
+    def _grow(self) -> None:
+        rows, cols = self.grid.shape
+        grown = np.zeros((rows * 2, cols * 2), dtype=np.int8)
+        grown[rows // 2:rows // 2 + rows, cols // 2:cols // 2 + cols] = self.grid
+        seen = np.zeros((rows * 2, cols * 2), dtype=bool)
+        seen[rows // 2:rows // 2 + rows, cols // 2:cols // 2 + cols] = self.seen
+        self.grid = grown
+        self.seen = seen
+        self.offset = self.offset + np.array([cols // 2, rows // 2])
+
+    def _index(self, points: np.ndarray) -> np.ndarray:
+        """World (x, y) points → (column, row) cell indices, possibly outside the grid."""
+        return np.floor(points / self.resolution).astype(np.int64) + self.offset
+
+    def _inside(self, ij: np.ndarray) -> np.ndarray:
+        return np.all((ij >= 0) & (ij < np.array(self.grid.shape[::-1])), axis=-1)
+
+    def _cells(self, points: np.ndarray) -> np.ndarray:
+        """World (x, y) points → flat indices into the grid."""
+        ij = self._index(points)
+        return ij[..., 1] * self.grid.shape[1] + ij[..., 0]
+
+    def _rays(self, x: float, y: float, heading: float, angles: np.ndarray,
+              ranges: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Sample points along each ray; returns (points[R, S, 2], inside[R, S])."""
+        step = self.resolution / 2
+        samples = np.arange(0.0, float(ranges.max()) + step, step)
+        theta = np.radians(heading + angles)[:, None]
+        points = np.stack((x + np.cos(theta) * samples, y + np.sin(theta) * samples), axis=-1)
+        return points, samples[None, :] < ranges[:, None]
+
+    def integrate(self, x: float, y: float, heading: float, distances: Dict[int, float]) -> None:
+        """Ray-cast one `{angle: metres}` reading taken at pose (x, y, heading)."""
+        if not distances:
+            return
+        angles = np.array(list(distances), dtype=np.float64)
+        measured = np.array(list(distances.values()), dtype=np.float64)
+        ranges = np.clip(measured, 0.0, self.max_range)
+        points, inside = self._rays(x, y, heading, angles, ranges)
+
+        hit = measured < self.max_range
+        theta = np.radians(heading + angles)
+        ends = np.stack((x + np.cos(theta) * ranges, y + np.sin(theta) * ranges), axis=-1)
+        self._ensure_contains(np.concatenate((points[inside], ends, [[x, y]])))
+
+        occupied = np.unique(self._cells(ends[hit]))
+        free = np.setdiff1d(np.unique(self._cells(points[inside])), occupied)
+        flat = self.grid.reshape(-1)
+        for cells, delta in ((free, LOG_ODDS_FREE), (occupied, LOG_ODDS_OCCUPIED)):
+            if cells.size:
+                flat[cells] = np.clip(flat[cells].astype(np.int16) + delta,
+                                      -LOG_ODDS_MAX, LOG_ODDS_MAX)
+                self.seen.reshape(-1)[cells] = True
+        self.updates += 1
+
+    def clearance(self, x: float, y: float, heading: float,
+                  angles) -> Dict[int, tuple[float, bool]]:
+        """
+        Free distance along each relative angle, as `(metres, known)`.  The
+        ray stops at the first occupied cell, or at the first cell never
+        observed, in which case `known` is False.
+        """
+        angles = np.asarray(list(angles), dtype=np.float64)
+        ranges = np.full(angles.shape, self.max_range)
+        points, _ = self._rays(x, y, heading, angles, ranges)
+        ij = self._index(points)
+        inside_map = self._inside(ij)
+        cells = np.where(inside_map, ij[..., 1] * self.grid.shape[1] + ij[..., 0], 0)
+        unseen = ~(inside_map & self.seen.reshape(-1)[cells])
+        unseen[:, -1] = False       # reaching max_range counts as a known end
+        blocked = (inside_map & (self.grid.reshape(-1)[cells] >= OCCUPIED_THRESHOLD)) | unseen
+        step = self.resolution / 2
+        stops = blocked.argmax(axis=1)
+        first = np.where(blocked.any(axis=1), stops * step, self.max_range)
+        known = ~unseen[np.arange(len(angles)), stops] | ~blocked.any(axis=1)
+        return {int(a): (round(float(d), 2), bool(k)) for a, d, k in zip(angles, first, known)}
+
+    def describe(self, x: float, y: float, heading: float,
+                 angles=(-90, -60, -30, 0, 30, 60, 90)) -> str:
+        """One-line free-space summary for the prompt."""
+        parts = []
+        for a, (d, known) in self.clearance(x, y, heading, angles).items():
+            if known:
+                parts.append(f"{a:+d}°: {d:.2f} m")
+            elif d < 2 * self.resolution:
+                parts.append(f"{a:+d}°: unknown")
+            else:
+                parts.append(f"{a:+d}°: {d:.2f} m, then unknown")
+        return f"Mapped free space around you (left is +): {', '.join(parts)}."
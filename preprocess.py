@@ -0,0 +1,63 @@
+import io
+from contextlib import nullcontext
+
+from PIL import Image
+
+# Gemma 3's vision encoder works on fixed 896x896 inputs.
+GEMMA3_INPUT = 896
+
+
+class FramePreprocessor:
+    """
+    Shrinks camera frames to what the vision encoder actually sees.
+
+    Frames are decoded (letting the JPEG decoder downscale by a power of two
+    where it can), optionally cropped to `crop`, a `(left, top, right,
+    bottom)` box in fractions of the frame, resized to `size` x `size`
+    (stretched, as the encoder would, or with `keep_aspect` scaled to fit
+    and letterboxed with black bars) and re-encoded at `quality`.  Each
+    stage is timed on `timer`.
+    """
+
+    def __init__(self, size: int = GEMMA3_INPUT, crop: tuple | None = None,
+                 quality: int = 85, keep_aspect: bool = False):
+        self.size = size
+        self.crop = crop
+        self.quality = quality
+        self.keep_aspect = keep_aspect
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __call__(self, data: bytes, timer=None) -> bytes:
+        span = timer.span if timer is not None else lambda name: nullcontext()
+        with span("pre_decode"):
+            img = Image.open(io.BytesIO(data))
+            img.draft("RGB", (self.size, self.size))
+            img = img.convert("RGB")
+        with span("pre_resize"):
+            if self.crop is not None:
+                w, h = img.size
+                left, top, right, bottom = self.crop
+                img = img.crop((round(left * w), round(top * h), round(right * w), round(bottom * h)))
+            if self.keep_aspect:
+                img.thumbnail((self.size, self.size), Image.BILINEAR)
+                if img.size != (self.size, self.size):
+                    # pad to the square the encoder expects instead of letting it stretch
+                    boxed = Image.new("RGB", (self.size, self.size))
+                    boxed.paste(img, ((self.size - img.width) // 2, (self.size - img.height) // 2))
+                    img = boxed
+            elif img.size != (self.size, self.size):
+                img = img.resize((self.size, self.size), Image.BILINEAR)
+        with span("pre_encode"):
+            out = io.BytesIO()
+            img.save(out, "JPEG", quality=self.quality)
+            result = out.getvalue()
+        self.bytes_in += len(data)
+        self.bytes_out += len(result)
+        if timer is not None:
+            timer.set("frame_bytes", [len(data), len(result)])
+        return result
+
+    def ratio(self) -> float:
+        """Bytes sent to the model per byte captured so far."""
+        return self.bytes_out / self.bytes_in if self.bytes_in else 1.0
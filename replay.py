@@ -0,0 +1,274 @@
+"""
+Offline replay of recorded steps through a backend and prompt variants.
+
+Each recorded frame is sent again with the memory the robot had at that
+point (the commands recorded before it) and the reply is compared with the
+command the robot actually executed:
+
+    python replay.py unused_files/exploration_log.json --variant terse=prompts/terse.json --workers 4
+    python replay.py captures/ --mock 40        # frames only: latency/tokens, no agreement
+
+A capture store folder (one with an index.jsonl) is replayed run by run in
+step order, including frames already packed into archive segments.
+
+A variant file is either plain text (the system prompt) or JSON with
+optional "system" and "task" keys.  Replies are cached on disk under
+`--cache`, keyed by (image hash, prompt hash, backend and model), so
+rerunning after adding a variant only pays for the new one.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from backends import OllamaBackend, TransformersEngine
+from capture_store import INDEX, CaptureStore
+from commands import parse_freeform
+from memory import ConversationMemory, command_name
+from mock_llm import MockChat
+from run_ollama import MODEL, SYSTEM_PROMPT, TASK_PROMPT, build_user_prompt
+
+_DISTANCE_RE = re.compile(r"(?:closest (?:obstacle|object) is|distance of) (\d+(?:\.\d+)?) ?m")
+
+
+@dataclass
+class RecordedStep:
+    image: str | bytes
+    distance: float
+    command: list | None = None   # what the robot executed, if known
+    name: str | None = None
+
+
+@dataclass
+class Variant:
+    name: str
+    system: str = SYSTEM_PROMPT
+    task: str = TASK_PROMPT
+
+    @classmethod
+    def load(cls, spec: str) -> "Variant":
+        name, path = spec.split("=", 1)
+        with open(path) as f:
+            text = f.read()
+        if not path.endswith(".json"):
+            return cls(name, system=text)
+        fields = json.loads(text)
+        return cls(name, fields.get("system", SYSTEM_PROMPT), fields.get("task", TASK_PROMPT))
+
+
+def load_steps(source: str, default_distance: float = 1.0) -> list[RecordedStep]:
+    """Recorded steps from an exploration log (.json list or .jsonl) or a folder of frames."""
+    if os.path.exists(os.path.join(source, INDEX)):
+        store = CaptureStore(source, readonly=True)
+        steps = []
+        for _, _, seq in store.steps():
+            # frames packed into archive segments are replayed from memory
+            image = store.path(seq=seq) or store.read(seq=seq)
+            if image is not None:
+                steps.append(RecordedStep(image, default_distance))
+        return steps
+    if os.path.isdir(source):
+        frames = sorted(glob.glob(os.path.join(source, "*.jpg")))
+        return [RecordedStep(frame, default_distance) for frame in frames]
+    with open(source) as f:
+        if source.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+    folder = os.path.dirname(source)
+    steps = []
+    for entry in entries:
+        if "image" not in entry:
+            continue
+        reasoning = entry.get("reasoning", "")
+        distance = entry.get("distance")
+        if distance is None:
+            match = _DISTANCE_RE.search(reasoning)
+            distance = float(match.group(1)) if match else default_distance
+        image = entry["image"]
+        if not os.path.isabs(image) and not os.path.exists(image):
+            image = os.path.join(folder, image)
+        command = entry.get("command")
+        name = command_name(command, reasoning.splitlines()[-1] if reasoning else "") if command else None
+        steps.append(RecordedStep(image, float(distance), command, name))
+    return steps
+
+
+def file_hash(image: str | bytes) -> str:
+    if isinstance(image, bytes):
+        return hashlib.sha256(image).hexdigest()
+    with open(image, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class ReplayCache:
+    """One JSON file per (image hash, prompt hash, model key) under `folder`."""
+
+    def __init__(self, folder: str = "replay_cache"):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, image_hash: str, messages: list, model: str) -> str:
+        prompt = json.dumps([{k: m[k] for k in ("role", "content")} for m in messages])
+        prompt_hash = hashlib.sha256(prompt.encode()).hexdigest()
+        key = hashlib.sha256(f"{image_hash}:{prompt_hash}:{model}".encode()).hexdigest()
+        return os.path.join(self.folder, key[:2], f"{key}.json")
+
+    def get(self, path: str) -> dict | None:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, path: str, result: dict) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp, path)
+
+
+def messages_for(variant: Variant, steps: list[RecordedStep], i: int) -> list:
+    """Prompt for step `i` with the memory the robot had built up by then."""
+    history = ConversationMemory()
+    for earlier in steps[:i]:
+        if earlier.command is not None:
+            history.add(earlier.command, earlier.name, earlier.distance)
+    step = steps[i]
+    return [
+        {"role": "system", "content": variant.system},
+        {"role": "user", "content": build_user_prompt(step.distance - 0.5, history, task=variant.task),
+         "images": [step.image]},
+    ]
+
+
+def replay_one(backend, cache: ReplayCache, model: str, variant: Variant,
+               steps: list[RecordedStep], i: int, image_hash: str, cache_model: str) -> dict:
+    messages = messages_for(variant, steps, i)
+    path = cache.path(image_hash, messages, cache_model)
+    result = cache.get(path)
+    if result is not None:
+        return {**result, "cached": True}
+    started = time.perf_counter()
+    response = backend(model=model, messages=messages)
+    result = {
+        "content": response.message.content,
+        "latency_s": time.perf_counter() - started,
+        "prompt_eval_count": response.prompt_eval_count,
+        "eval_count": response.eval_count,
+    }
+    cache.put(path, result)
+    return {**result, "cached": False}
+
+
+def same_command(a: list, b: list) -> bool:
+    return abs(a[0] - b[0]) <= 0.1 and abs(a[1] - b[1]) <= 5
+
+
+def evaluate(steps: list[RecordedStep], results: list[dict]) -> dict:
+    """Agreement with the recorded commands plus latency and token statistics."""
+    parsed, names, exact, compared = 0, 0, 0, 0
+    for step, result in zip(steps, results):
+        try:
+            command_arr, name = parse_freeform(result["content"])
+        except (ValueError, SyntaxError, IndexError):
+            continue
+        parsed += 1
+        if step.command is None:
+            continue
+        compared += 1
+        names += name == step.name
+        exact += name == step.name and same_command(command_arr, step.command)
+    # cached replies keep the latency measured when they were generated
+    latencies = [r["latency_s"] for r in results]
+    tokens = [r["eval_count"] for r in results if r.get("eval_count") is not None]
+    prompts = [r["prompt_eval_count"] for r in results if r.get("prompt_eval_count") is not None]
+    return {
+        "steps": len(results),
+        "cached": sum(r["cached"] for r in results),
+        "parsed": parsed,
+        "compared": compared,
+        "name_agreement": names / compared if compared else None,
+        "exact_agreement": exact / compared if compared else None,
+        "latency_p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "latency_max_ms": max(latencies) * 1000 if latencies else None,
+        "mean_eval_tokens": statistics.mean(tokens) if tokens else None,
+        "mean_prompt_tokens": statistics.mean(prompts) if prompts else None,
+    }
+
+
+def cache_model(backend, model: str) -> str:
+    """What actually answers `model`, so one backend's replies are never served for another."""
+    if isinstance(backend, TransformersEngine):
+        return f"transformers:{backend.model_id}"
+    if isinstance(backend, MockChat):
+        return f"mock@{backend.token_rate}"
+    return model
+
+
+def replay(backend, steps: list[RecordedStep], variants: list[Variant], model: str = MODEL,
+           workers: int = 4, cache: ReplayCache | None = None) -> dict[str, dict]:
+    cache = cache or ReplayCache()
+    key = cache_model(backend, model)
+    hashes = [file_hash(step.image) for step in steps]
+    report = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay") as pool:
+        for variant in variants:
+            jobs = [pool.submit(replay_one, backend, cache, model, variant, steps, i, hashes[i], key)
+                    for i in range(len(steps))]
+            report[variant.name] = evaluate(steps, [job.result() for job in jobs])
+    return report
+
+
+def _fmt(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded steps through prompt variants")
+    parser.add_argument("source", help="exploration log (.json/.jsonl) or a folder of frames")
+    parser.add_argument("--variant", action="append", default=[], metavar="NAME=FILE",
+                        help="prompt variant to evaluate (the current prompts run as 'baseline')")
+    parser.add_argument("--no-baseline", action="store_true", help="only run the given variants")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--backend", choices=["ollama", "transformers"], default="ollama")
+    parser.add_argument("--mock", type=float, default=0.0, metavar="TOK_S",
+                        help="use the mock model at this many tokens/s")
+    parser.add_argument("--workers", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--distance", type=float, default=1.0,
+                        help="centre distance to assume when a step has none recorded")
+    parser.add_argument("--cache", default="replay_cache", help="folder for cached replies")
+    parser.add_argument("--out", help="also write the report as JSON here")
+    args = parser.parse_args()
+
+    steps = load_steps(args.source, args.distance)
+    variants = ([] if args.no_baseline else [Variant("baseline")]) + [Variant.load(v) for v in args.variant]
+    if args.mock:
+        backend = MockChat(args.mock, prompt_rate=20 * args.mock)
+    elif args.backend == "transformers":
+        backend = TransformersEngine(max_batch=args.workers)
+    else:
+        backend = OllamaBackend()
+
+    try:
+        report = replay(backend, steps, variants, args.model, args.workers, ReplayCache(args.cache))
+    finally:
+        if isinstance(backend, TransformersEngine):
+            backend.close()
+
+    print(f"🔁  {len(steps)} recorded steps, {sum(s.command is not None for s in steps)} with a reference command")
+    for name, r in report.items():
+        print(f"== {name}: parsed {r['parsed']}/{r['steps']} ({r['cached']} cached), "
+              f"command agreement {_fmt(r['name_agreement'], '.0%')}, exact {_fmt(r['exact_agreement'], '.0%')}")
+        print(f"   latency p50 {_fmt(r['latency_p50_ms'], '.0f')} ms, max {_fmt(r['latency_max_ms'], '.0f')} ms; "
+              f"tokens prompt {_fmt(r['mean_prompt_tokens'], '.0f')}, generated {_fmt(r['mean_eval_tokens'], '.0f')}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,210 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+ROBOT_URL = os.environ.get("ROBOT_URL", "http://192.168.4.1:5000")
+
+# (connect, read) seconds per endpoint.  The move POST gets the longest read
+# timeout because the robot may only answer once the motion has finished.
+DEFAULT_TIMEOUTS = {
+    "capture": (2, 5),
+    "distance": (2, 3),
+    "move": (2, 15),
+    "stop": (1, 2),
+    "status": (2, 3),
+}
+
+# Move replies that mean the motion has already ended.  A bare "ok" may
+# only acknowledge the command, so it still waits for the motion.
+DONE_STATUSES = ("done", "stopped", "idle")
+
+
+class MotionModel:
+    """
+    Rough duration of a move, used when the robot cannot report completion:
+    rotation at `turn_rate` °/s, then driving at `speed` m/s, plus a fixed
+    `overhead` for acceleration and braking.
+    """
+
+    def __init__(self, speed: float = 0.25, turn_rate: float = 90.0, overhead: float = 0.15):
+        self.speed = speed
+        self.turn_rate = turn_rate
+        self.overhead = overhead
+
+    def estimate(self, x: float, theta: float) -> float:
+        if not x and not theta:
+            return 0.0
+        return abs(theta) / self.turn_rate + abs(x) / self.speed + self.overhead
+
+
+class RobotClient:
+    """
+    Shared client for the robot's Flask API.
+
+    All requests go through one `requests.Session`, so the TCP connection to
+    the robot is kept alive and reused instead of being re-established for
+    every capture, distance query and move.
+    """
+
+    def __init__(self, base_url: str = ROBOT_URL,
+                 timeouts: Dict[str, tuple] | None = None,
+                 pool_size: int = 4, motion: MotionModel | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.motion = motion or MotionModel()
+        self._has_status = None  # unknown until the first /move/status call
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="robot")
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}{path}"
+
+    def _get_json(self, path: str, timeout: tuple) -> dict:
+        resp = self.session.get(self._url(path), timeout=timeout)
+        resp.raise_for_status()
+        payload = resp.json()
+        if isinstance(payload, dict) and "error" in payload:
+            raise RuntimeError(f"Sensor error: {payload['error']}")
+        return payload
+
+    def capture(self) -> bytes:
+        """Return the raw JPEG bytes of a fresh camera frame."""
+        try:
+            resp = self.session.get(self._url("/capture"),
+                                    timeout=self.timeouts["capture"])
+            resp.raise_for_status()
+            return resp.content
+        except requests.RequestException as e:
+            raise RuntimeError(f"Camera capture failed: {e}") from e
+
+    def center_distance(self) -> float:
+        """Return the `/distance/center` reading in metres."""
+        try:
+            payload = self._get_json("/distance/center", self.timeouts["distance"])
+        except requests.RequestException as e:
+            raise RuntimeError(f"Distance query failed: {e}") from e
+
+        # The Flask endpoint returns either {"angle": 0, "distance_m": 0.742}
+        # or {"error": "..."}.
+        if "distance_m" not in payload:
+            raise RuntimeError(f"Malformed payload: {payload}")
+        return float(payload["distance_m"])
+
+    def all_distances(self) -> Dict[int, float]:
+        """Return the `/distance/all` readings as `{angle: metres}`."""
+        try:
+            payload = self._get_json("/distance/all", self.timeouts["distance"])
+        except requests.RequestException as e:
+            raise RuntimeError(f"Distance query failed: {e}") from e
+
+        if not isinstance(payload, dict):
+            raise RuntimeError(f"Malformed payload: {payload}")
+        return {int(angle): float(dist) for angle, dist in payload.items()}
+
+    def move(self, x: float, theta: float) -> dict:
+        """POST a move and return the robot's JSON reply."""
+        payload = {"x": x, "y": 0, "theta": theta}
+        try:
+            resp = self.session.post(self._url("/move"), json=payload,
+                                     timeout=self.timeouts["move"])
+        except requests.RequestException as e:
+            raise RuntimeError(f"Move failed: {e}") from e
+        if resp.status_code != 200:
+            raise RuntimeError(f"Move failed with status {resp.status_code}: {resp.text}")
+        return resp.json()
+
+    def stop(self) -> dict:
+        """Ask the robot to halt any motion in progress."""
+        try:
+            resp = self.session.post(self._url("/stop"), timeout=self.timeouts["stop"])
+            resp.raise_for_status()
+            return resp.json()
+        except requests.RequestException as e:
+            raise RuntimeError(f"Stop failed: {e}") from e
+
+    def move_status(self, wait: float = 0.0) -> dict | None:
+        """
+        Return the `/move/status` reply, e.g. `{"state": "moving"}`, or None
+        if the robot has no such endpoint.  With `wait` the robot may hold
+        the reply for up to that many seconds until the move has ended.
+        """
+        connect, read = self.timeouts["status"]
+        try:
+            resp = self.session.get(self._url("/move/status"), params={"wait": wait} if wait else None,
+                                    timeout=(connect, read + wait))
+        except requests.RequestException as e:
+            raise RuntimeError(f"Move status failed: {e}") from e
+        if resp.status_code == 404:
+            return None
+        if resp.status_code != 200:
+            raise RuntimeError(f"Move status failed with status {resp.status_code}: {resp.text}")
+        return resp.json()
+
+    def wait_for_motion(self, x: float, theta: float, reply: dict | None = None,
+                        sent: float | None = None, poll: float = 1.0) -> dict:
+        """
+        Block until the move just posted has finished and return the final reply.
+
+        A reply whose status says the move finished (`DONE_STATUSES`)
+        returns at once; an acknowledgement such as "ok" does not.  Otherwise
+        `/move/status` is long-polled, and robots without that endpoint are
+        given the `MotionModel` estimate counted from `sent` (monotonic time
+        the move was posted).
+        """
+        if isinstance(reply, dict) and reply.get("status") in DONE_STATUSES:
+            return reply
+        if sent is None:
+            sent = time.monotonic()
+        budget = sent + 2 * self.motion.estimate(x, theta) + self.timeouts["move"][1]
+        while self._has_status is not False:
+            status = self.move_status(wait=poll)
+            self._has_status = status is not None
+            if status is None:
+                break
+            if status.get("state") != "moving":
+                return status
+            if time.monotonic() > budget:
+                raise RuntimeError(f"Move still in progress after {time.monotonic() - sent:.1f} s")
+        remaining = sent + self.motion.estimate(x, theta) - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+        return {**(reply or {}), "status": "ok", "state": "idle", "estimated": True}
+
+    def sense(self, all_angles: bool = False, concurrent: bool = True, timer=None):
+        """
+        Fetch a frame and the distance reading(s) for one step.
+
+        Returns `(jpeg_bytes, distance)` where `distance` is the centre
+        reading, or the `{angle: metres}` dict when `all_angles` is set.
+        With `concurrent` the two requests are in flight at the same time
+        over separate pooled connections.  `timer` (e.g. a `StepMetrics`)
+        records the latency of each request as "capture" and "distance".
+        """
+        read_distance = self.all_distances if all_angles else self.center_distance
+        capture = self.capture
+        if timer is not None:
+            capture = partial(timer.timed, "capture", capture)
+            read_distance = partial(timer.timed, "distance", read_distance)
+        if not concurrent:
+            return capture(), read_distance()
+        frame = self._pool.submit(capture)
+        distance = self._pool.submit(read_distance)
+        return frame.result(), distance.result()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
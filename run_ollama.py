@@ -1,13 +1,34 @@
+from __future__ import annotations
+
 import time
-import ast
-import os
-from datetime import datetime
+# reference point for the time-to-first-command report
+started_at = time.perf_counter()
+
+import math
+import argparse
+import base64
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
 from zoneinfo import ZoneInfo  
-from ollama import chat
-from ollama import ChatResponse
-import requests
+from robot_client import RobotClient
+from capture_store import CaptureStore
+from memory import ConversationMemory
+from metrics import MetricsRecorder, StepMetrics
+from backends import OllamaBackend, keep_alive_value
+from commands import (StreamCommandParser, decision_schema, parse_freeform, parse_plan,
+                      parse_structured, plan_schema)
 # import pyttsx3
-from typing import Dict
+from typing import TYPE_CHECKING, Dict
+
+# ollama, numpy, Pillow and torch are only imported by the features that
+# need them, so startup is not spent loading libraries the mission won't use
+if TYPE_CHECKING:
+    from ollama import ChatResponse
+    from decision_cache import DecisionCache
+    from occupancy_grid import OccupancyGrid
+    from preprocess import FramePreprocessor
+    from safety import SafetyMonitor
+    from sensors import SensorSampler
 
 # _tts_engine = pyttsx3.init()
 # _tts_engine.setProperty("rate", 180)       # words-per-minute
@@ -40,6 +61,63 @@ Return **exactly three separate lines without any ``` on the first line**:
 3. The exact command. For example, MOVE_BACKWARD
 """
 
+# Reply format for structured mode: a single JSON object constrained by
+# decision_schema(), with no free-text reasoning unless asked for.
+STRUCTURED_SYSTEM_PROMPT = SYSTEM_PROMPT.split("### Output format")[0] + """### Output format
+Return only a JSON object with:
+- "command": one of MOVE_FORWARD, MOVE_BACKWARD, ROTATE_LEFT, ROTATE_RIGHT
+- "x": metres to move (0 when rotating)
+- "theta": degrees to rotate as a positive value (0 when moving)
+- "reasoning": only if requested, one short sentence
+"""
+
+# Streaming needs the command before the reasoning so it can be acted on
+# while the explanation is still being generated.
+STREAM_SYSTEM_PROMPT = SYSTEM_PROMPT.split("### Output format")[0] + """### Output format
+Return **exactly three separate lines without any ``` on the first line**:
+1. The chosen command with the distance/degrees. It should be an array only containing the x and theta(rotation degrees) as positive values. For example, more forward should be [0.5,0] and rotate right 90 degrees should be [0,90]. You are not allowed to have rotation with movement.
+2. The exact command. For example, MOVE_BACKWARD
+3. REASONING: short explanation of the chosen command.
+"""
+
+# Plan mode: several moves per inference, executed until the sensors
+# disagree with what the plan assumed.
+PLAN_SYSTEM_PROMPT = SYSTEM_PROMPT.split("### Output format")[0] + """### Output format
+Plan up to {max_steps} moves that can be executed one after another without looking again.
+Return **exactly two separate lines without any ```**:
+1. REASONING: one or two sentences.
+2. PLAN: the moves separated by semicolons, for example PLAN: MOVE_FORWARD(0.8); ROTATE_LEFT(45); MOVE_FORWARD(0.5)
+Only plan forward moves you are confident are free; end the plan with a rotation if you need a new view.
+"""
+
+STRUCTURED_PLAN_SYSTEM_PROMPT = SYSTEM_PROMPT.split("### Output format")[0] + """### Output format
+Plan up to {max_steps} moves that can be executed one after another without looking again.
+Return only a JSON object {{"plan": [...]}} where each move has:
+- "command": one of MOVE_FORWARD, MOVE_BACKWARD, ROTATE_LEFT, ROTATE_RIGHT
+- "x": metres to move (0 when rotating)
+- "theta": degrees to rotate as a positive value (0 when moving)
+Only plan forward moves you are confident are free; end the plan with a rotation if you need a new view.
+"""
+
+MODEL = "gemma3:12b"
+# how long Ollama keeps the model loaded after each request; long enough
+# that it is still there after the operator pauses at the confirmation prompt
+KEEP_ALIVE = "30m"
+chat = OllamaBackend(keep_alive=KEEP_ALIVE)
+# 32x32 grey JPEG, enough to bring up the vision encoder during warm-up
+WARMUP_FRAME = base64.b64decode(
+    "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxOQERX"
+    "RTc4UG1RV19iZ2hnPk1xeXBkeFxlZ2P/2wBDARESEhgVGC8aGi9jQjhCY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2Nj"
+    "Y2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAARCAAgACADASIAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAA"
+    "AAECAwQFBgcICQoL/8QAtRAAAgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAk"
+    "M2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJipKT"
+    "lJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QA"
+    "HwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQDBAcFBAQAAQJ3AAECAxEEBSExBhJBUQdh"
+    "cRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hp"
+    "anN0dXZ3eHl6goOEhYaHiImKkpOUlZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk"
+    "5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwAooooAKKKKACiiigAooooA/9k="
+)
+
 # assistant_history = []
 
 # def say(text: str, wait: bool = True) -> None:
@@ -62,127 +140,286 @@ Return **exactly three separate lines without any ``` on the first line**:
 #     except Exception as e:  # pragma: no cover
 #         return jsonify({"error": str(e)}), 500
 
-def fetch_image(api_url: str = "http://192.168.4.1:5000/capture",
-                folder: str = "captures") -> str:
-    """Capture a frame and save it as captures/captured_YYYYMMDD_HHMMSS.jpg."""
-    os.makedirs(folder, exist_ok=True)
-
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    save_path = os.path.join(folder, f"captured_{timestamp}.jpg")
-
-    try:
-        resp = requests.get(api_url, timeout=5)
-        resp.raise_for_status()
-        with open(save_path, "wb") as f:
-            f.write(resp.content)
-        print("📸  Saved image →", save_path)
-        return save_path
-    except requests.RequestException as e:
-        raise RuntimeError(f"Camera capture failed: {e}") from e
+class Pose:
+    """Dead-reckoned pose from the executed commands (heading in degrees, left is +)."""
+
+    def __init__(self, x=0.0, y=0.0, heading=0.0):
+        self.x = x
+        self.y = y
+        self.heading = heading  # degrees, 0 = initial forward
+
+    def update(self, command):
+        dx, theta = command
+        # update heading first
+        self.heading = (self.heading + theta) % 360
+        # move along new heading
+        rad = math.radians(self.heading)
+        self.x += dx * math.cos(rad)
+        self.y += dx * math.sin(rad)
+
+
+robot = RobotClient()
+metrics = MetricsRecorder()
+pose = Pose()
+# set to map free space from /distance/all readings instead of using only
+# the centre distance
+occupancy: OccupancyGrid | None = None
+# set to read distances from a background /distance/all poller instead of
+# making a request per step
+sampler: SensorSampler | None = None
+# sampler reads are the median over this window, using only samples taken
+# after the last move finished; until one arrives the newest sample is used
+# if it is younger than max_sample_age seconds
+median_ms = 200.0
+max_sample_age = 0.5
+last_move_end = 0.0
+# set to check every move against live /distance/all readings before and
+# while it executes
+safety: SafetyMonitor | None = None
+# bounded store behind captures/; with --in-memory only set by --archive
+captures: CaptureStore | None = None
+# set to shrink frames to the vision encoder's input size before upload
+preprocessor: FramePreprocessor | None = None
+
+
+def save_frame(data: bytes, folder: str = "captures", step: StepMetrics | None = None) -> str:
+    """Write JPEG bytes to the capture store (captures/frame_NNNNNNNN.jpg) and return the path."""
+    global captures
+    if captures is None:
+        captures = CaptureStore(folder)
+    save_path = captures.put(data, step.step if step else None)
+    print("📸  Saved image →", save_path)
+    return save_path
+
+
+def archive_frame(data: bytes, step: StepMetrics | None = None) -> None:
+    """Hand an in-memory frame to the capture store's writer thread, if archiving."""
+    if captures is not None:
+        captures.submit(data, step.step if step else None)
+
+
+def prepare_frame(data: bytes, step: StepMetrics | None = None) -> bytes:
+    """The frame as it will be sent to the model (resized/re-encoded if enabled)."""
+    if preprocessor is None:
+        return data
+    return preprocessor(data, timer=step)
+
+
+def fetch_image(folder: str = "captures", client: RobotClient = robot,
+                step: StepMetrics | None = None) -> str:
+    """Capture a frame and save it to the capture store."""
+    data = step.timed("capture", client.capture) if step else client.capture()
+    return save_frame(prepare_frame(data, step), folder, step)
+
+
+def fetch_frame(client: RobotClient = robot, step: StepMetrics | None = None) -> bytes:
+    """Capture a frame and keep it in memory, archiving it in the background if enabled."""
+    data = step.timed("capture", client.capture) if step else client.capture()
+    archive_frame(data, step)
+    return prepare_frame(data, step)
       
-def fetch_center_distance(
-    api_url: str = "http://192.168.4.1:5000/distance/center",
-    timeout: int = 3,
-) -> float:
+def fetch_center_distance(client: RobotClient = robot) -> float:
     """
     Call the `/distance/center` endpoint and return the distance (metres).
 
     Raises `RuntimeError` if the request fails or the payload is malformed.
     """
-    try:
-        resp = requests.get(api_url, timeout=timeout)
-        resp.raise_for_status()
-        payload = resp.json()
-
-        # The Flask endpoint returns either {"angle": 0, "distance_m": 0.742}
-        # or {"error": "..."}.
-        if "error" in payload:
-            raise RuntimeError(f"Sensor error: {payload['error']}")
-        if "distance_m" not in payload:
-            raise RuntimeError(f"Malformed payload: {payload}")
+    distance = client.center_distance()
+    print(f"📏  Center distance → {distance:.3f} m")
+    return distance
 
-        distance = float(payload["distance_m"])
-        print(f"📏  Center distance → {distance:.3f} m")
-        return distance
 
-    except requests.RequestException as e:
-        raise RuntimeError(f"Distance query failed: {e}") from e
-
-
-def fetch_all_distances(
-    api_url: str = "http://192.168.4.1:5000/distance/all",
-    timeout: int = 3,
-) -> Dict[int, float]:
+def fetch_all_distances(client: RobotClient = robot) -> Dict[int, float]:
     """
     Call the `/distance/all` endpoint and return `{angle: metres}`.
 
     Example result: `{ -30: 0.711, 0: 0.742, 30: 0.695 }`
     """
-    try:
-        resp = requests.get(api_url, timeout=timeout)
-        resp.raise_for_status()
-        payload = resp.json()
-
-        if "error" in payload:
-            raise RuntimeError(f"Sensor error: {payload['error']}")
-        if not isinstance(payload, dict):
-            raise RuntimeError(f"Malformed payload: {payload}")
-
-        # Convert keys and values to the exact types we want
-        distances = {int(angle): float(dist) for angle, dist in payload.items()}
-
-        pretty = ", ".join(f"{ang:+d}°={dist:.3f} m"
-                           for ang, dist in sorted(distances.items()))
-        print(f"📊  All distances → {pretty}")
-        return distances
-
-    except requests.RequestException as e:
-        raise RuntimeError(f"Distance query failed: {e}") from e
+    distances = client.all_distances()
+    pretty = ", ".join(f"{ang:+d}°={dist:.3f} m"
+                       for ang, dist in sorted(distances.items()))
+    print(f"📊  All distances → {pretty}")
+    return distances
         
-def send_move_command(command, api_url="http://192.168.4.1:5000/move"):
+def send_move_command(command, client: RobotClient = robot,
+                      step: StepMetrics | None = None) -> bool:
+    global last_move_end
     x=command[0]
     #y = command[1]
     theta = command[1]
     
     print("commands", command)
+
+    watch = nullcontext()
+    if safety is not None:
+        checked, reason = safety.check(command)
+        if checked is None:
+            print(f"🛑  Vetoed '{command}': {reason}")
+            return False
+        if checked != command:
+            print(f"⚠️  Safety {reason}")
+        command = checked
+        x, theta = command
+        watch = safety.watching(command)
+    if step is None:
+        step = StepMetrics(0)
     
-    payload = {"x": x, "y": 0, "theta": theta}
     try:
-        response = requests.post(api_url, json=payload)
-        if response.status_code == 200:
-            print(f"Command '{command}' sent successfully:", response.json())
-        else:
-            print(f"Failed to send command '{command}'. Status code: {response.status_code}")
-            print("Response:", response.text)
+        # don't return until the robot has settled, so the next frame is
+        # taken as soon as (and not before) the motion has ended
+        with watch:
+            sent = time.monotonic()
+            reply = step.timed("move", client.move, x, theta)
+            reply = step.timed("settle", client.wait_for_motion, x, theta, reply, sent)
+        print(f"Command '{command}' sent successfully:", reply)
     except Exception as e:
         print(f"Error sending command '{command}': {e}")
-
+        return False
+    finally:
+        last_move_end = time.monotonic()
+    # the robot reports the distance actually covered if it was stopped early
+    if isinstance(reply, dict) and reply.get("status") == "stopped":
+        command = [reply.get("x", x), theta]
+    pose.update(command)
+    return True
+
+
+def observe(distances: Dict[int, float]) -> float:
+    """Fold a multi-angle reading into the map and return the centre distance."""
+    if occupancy is not None:
+        occupancy.integrate(pose.x, pose.y, pose.heading, distances)
+    return distances.get(0, min(distances.values()))
+
+
+def sampled_distances() -> Dict[int, float] | None:
+    """Filtered `{angle: metres}` from the sampler, or None if it has nothing recent."""
+    if sampler is None:
+        return None
+    distances = sampler.median(median_ms, since=last_move_end)
+    if not distances:
+        distances, age = sampler.latest()
+        if age > max_sample_age or not distances:
+            return None
+    return distances
+
+
+def read_distance() -> float:
+    """Centre distance for the next decision, updating the map when enabled."""
+    distances = sampled_distances()
+    if distances is not None:
+        return observe(distances)
+    if occupancy is None:
+        return fetch_center_distance()
+    return observe(fetch_all_distances())
+
+
+# Static part of the user turn.  It comes before the memory block so the
+# prompt prefix stays byte-identical from one step to the next.
+TASK_PROMPT = (
+    "Analyze what you can see on the image first. "
+    "If you moved forward for multiple steps, maybe rotating might be useful to get a clearer view. "
+    "Then find your way out of the room. The exit is a glass door. This is your main goal and final destination. "
+)
 
 # At module level
-assistant_history: list[str] = []
+memory = ConversationMemory()
+# "text" is the original three-line reply; "json" constrains the reply to
+# decision_schema() and parses it without any string searching.
+output_mode = "text"
+# length cap for the optional reasoning field in json mode (0 = omit it)
+reasoning_chars = 0
+# stream the reply and act on the command as soon as it has been generated
+streaming = False
+# what happens to the rest of a streamed reply: "cancel" closes the stream
+# so Ollama stops generating, "log" drains it in the background for the log
+stream_tail = "cancel"
+# approve every non-zero command without prompting the operator
+auto_confirm = False
+# longest plan requested in plan mode, and how far (metres) the measured
+# distance may drift from the plan's expectation before re-planning
+plan_steps = 4
+plan_tolerance = 0.15
+# seconds from startup to the first decided command, once known
+first_command_s: float | None = None
+# reuse decisions for scenes that have not materially changed (None = off)
+decision_cache: DecisionCache | None = None
+
+
+def prompt_state() -> str:
+    """Everything that shapes a decision apart from the frame and the distance reading."""
+    return "\n".join((MODEL, output_mode, str(streaming), build_user_prompt(0.0)))
+
+
+def build_user_prompt(distance: float, history: ConversationMemory | None = None,
+                      grid: OccupancyGrid | None = None, at: Pose | None = None,
+                      task: str = "") -> str:
+    """
+    User turn for a decision; `distance` is the usable distance (reading - 0.5).
+    The memory, map and pose default to this process's own robot, and the
+    task text to TASK_PROMPT.
+    """
+    history = memory if history is None else history
+    grid, at = (occupancy, pose) if grid is None else (grid, at)
+    USER_PROMPT = (
+        (task or TASK_PROMPT) +
+        f"\nHistory of previously executed commands (memory):\n{history.render()}\n"
+        f"The distance to the closest object is {distance:.2f} meters. Do not move forward if less than 0.5."
+    )
+    if grid is not None:
+        USER_PROMPT += " " + grid.describe(at.x, at.y, at.heading)
+    return USER_PROMPT
 
-def call_ollama(image_path: str) -> bool:
-    distance = fetch_center_distance()-0.5
+
+def decide_command(image: str | bytes, distance: float | None = None,
+                   step: StepMetrics | None = None) -> list:
+    """
+    Ask the model for the next move and return it as `[x, theta]`.
+
+    `image` is either a path on disk or the raw JPEG bytes from the camera;
+    bytes are sent to Ollama as-is without a round trip through the disk.
+
+    `distance` is the raw centre reading in metres; it is fetched here when
+    the caller has not already sampled it.  Stage timings and Ollama's
+    token/duration counters are recorded on `step`.
+    """
+    if step is None:
+        step = StepMetrics(0)
+    if distance is None:
+        distance = step.timed("distance", read_distance)
+    reading = distance
+    distance -= 0.5
+    if decision_cache is not None:
+        with step.span("cache"):
+            fingerprint = decision_cache.fingerprint(image, reading)
+            cached = decision_cache.get(fingerprint, prompt_state())
+        if cached is not None:
+            # same scene, same readings, same memory: the model would
+            # only repeat itself.  The reuse still goes into the memory the
+            # model sees, and the entry follows it to the new prompt.
+            command_arr, name = cached
+            print(f"♻️  Scene unchanged, reusing {name} {command_arr}")
+            memory.add(command_arr, name, reading)
+            decision_cache.follow(prompt_state())
+            step.set("command", command_arr)
+            step.set("mode", "cache")
+            return command_arr
     #distanceAll = fetch_all_distances()
     # distance = 2.0  # For testing, use a fixed distance
     
-        # 2) Assemble the messages list, injecting the last N assistant outputs
+        # 2) Assemble the messages list: stable system + task text, then the
+        #    append-only memory block, then the per-step sensor reading
+    structured = output_mode == "json"
+    if structured:
+        system_prompt = STRUCTURED_SYSTEM_PROMPT
+    elif streaming:
+        system_prompt = STREAM_SYSTEM_PROMPT
+    else:
+        system_prompt = SYSTEM_PROMPT
     messages = [
-        {"role": "system", "content": SYSTEM_PROMPT}
+        {"role": "system", "content": system_prompt}
     ]
     
-    # keep only the last 5 for context (tune as needed)
-    for prev in assistant_history[-5:]:
-        messages.append({"role": "assistant", "content": prev})
-    
-    # 1) Build your user prompt as before
-    USER_PROMPT = (
-        f"history of previously executed commands(memory): {assistant_history}. "
-        f"The distance to the closest object is {distance:.2f} meters. Do not move forward if less than 0.5."
-        f"Analyze what you can see on the image first. "
-        f"If you moved forward for multiple steps, maybe rotating might be useful to get a clearer view."
-        f"Then find your way out of the room. The exit is a glass door. This is your main goal and final destination. "
-    )
+    USER_PROMPT = build_user_prompt(distance)
     
     print(USER_PROMPT)
     
@@ -191,71 +428,454 @@ def call_ollama(image_path: str) -> bool:
     messages.append({
         "role": "user",
         "content": USER_PROMPT,
-        "images": [image_path]
+        "images": [image]
     })
     
     # 3) Call Ollama with full context
-    response: ChatResponse = chat(
-        model='gemma3:12b',
-        messages=messages,
-    )
+    extra = {}
+    if structured:
+        extra["format"] = decision_schema(reasoning_chars)
+        # upper bound on generated tokens: the JSON skeleton plus reasoning
+        extra["options"] = {"num_predict": 48 + reasoning_chars // 2}
+    if streaming:
+        command_arr, name = _stream_decision(messages, structured, step, **extra)
+    else:
+        with step.span("inference"):
+            response: ChatResponse = chat(
+                model=MODEL,
+                messages=messages,
+                **extra,
+            )
+        step.add_ollama(response)
+        _print_usage(response)
+
+        # 5) Parse the reply
+        print(response.message.content)
+        with step.span("parse"):
+            if structured:
+                command_arr, name = parse_structured(response.message.content)
+            else:
+                command_arr, name = parse_freeform(response.message.content)
+    step.set("command", command_arr)
+    step.set("mode", output_mode + ("+stream" if streaming else ""))
+    _mark_first_command(step)
+    # say("response: " + response.message.content, wait=False)
+    print("after", command_arr)
 
-    
-    # 4) Save the raw assistant output into history BEFORE any post-processing
-    assistant_history.append("one command I already executed: " + response.message.content + " ")
-    
-    print("assistant_history", assistant_history)
-    
-    # 5) Your existing parsing logic
+    # Keep a one-line record of the decision instead of the raw text
+    memory.add(command_arr, name, reading)
+    if decision_cache is not None:
+        decision_cache.put(fingerprint, prompt_state(), command_arr, name)
+    return command_arr
+
+
+def decide_plan(image: str | bytes, distance: float,
+                step: StepMetrics | None = None) -> list[tuple[list, str]]:
+    """Ask the model for up to `plan_steps` moves and return `[([x, theta], name), ...]`."""
+    if step is None:
+        step = StepMetrics(0)
+    structured = output_mode == "json"
+    template = STRUCTURED_PLAN_SYSTEM_PROMPT if structured else PLAN_SYSTEM_PROMPT
+    USER_PROMPT = build_user_prompt(distance - 0.5)
+    print(USER_PROMPT)
+    messages = [
+        {"role": "system", "content": template.format(max_steps=plan_steps)},
+        {"role": "user", "content": USER_PROMPT, "images": [image]},
+    ]
+    extra = {"format": plan_schema(plan_steps)} if structured else {}
+    with step.span("inference"):
+        response: ChatResponse = chat(model=MODEL, messages=messages, **extra)
+    step.add_ollama(response)
+    _print_usage(response)
     print(response.message.content)
-    lines = response.message.content.splitlines()
-    
-    command_arr = ast.literal_eval(lines[-2])      # [x, theta]
-    
-    reasoning   = "\n".join(lines[0:]).upper()    # easier case-insensitive search
+    with step.span("parse"):
+        plan = parse_plan(response.message.content, structured)[:plan_steps]
+    step.set("plan", [command for command, _ in plan])
+    _mark_first_command(step)
+    step.set("mode", output_mode + "+plan")
+    return plan
 
 
+def plan_deviation(previous: list, before: float, now: float, upcoming: list) -> str | None:
+    """
+    Why the rest of a plan should be dropped, or None to keep going.
 
-    
-    # exact_cmd = lines[2].strip()
-    # say("response: " + response.message.content, wait=False)
-    #print("reasoning", reasoning)
-    #print("before", command_arr)
-    # adjust right-turn sign
-    if "ROTATE_RIGHT" in reasoning and command_arr[1] > 0:
-        print('i am rotating right')
-        command_arr[1] = -command_arr[1]
+    A straight move of x metres should shorten the centre distance by x;
+    any upcoming forward move must also still fit in the free space.
+    """
+    if previous[0] and not previous[1]:
+        expected = before - previous[0]
+        if abs(now - expected) > plan_tolerance:
+            return f"expected {expected:.2f} m ahead, measured {now:.2f} m"
+    if upcoming[0] > 0 and upcoming[0] > now - 0.5:
+        return f"{upcoming[0]:.2f} m forward no longer fits in {now:.2f} m"
+    return None
+
+
+def confirm_plan(plan: list[tuple[list, str]], step: StepMetrics | None = None) -> bool:
+    """Ask the operator to approve a whole plan at once."""
+    print("plan:", "; ".join(f"{name} {command_arr}" for command_arr, name in plan))
+    return confirm_command([c for command_arr, _ in plan for c in command_arr], step)
+
+
+def warm_up() -> float:
+    """Load the model, vision encoder included, with a one-token dummy request."""
+    t0 = time.perf_counter()
+    response = chat(model=MODEL, options={"num_predict": 1}, messages=[
+        {"role": "user", "content": "Reply with OK.", "images": [WARMUP_FRAME]},
+    ])
+    elapsed = time.perf_counter() - t0
+    load = (getattr(response, "load_duration", None) or 0) / 1e9
+    print(f"🔥  Model warm after {elapsed:.1f} s (load {load:.1f} s)")
+    return elapsed
+
+
+def start_up() -> Future:
+    """Warm the model on a background thread while the loop captures its first frame."""
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="warm-up")
+    warming = pool.submit(warm_up)
+    warming.add_done_callback(
+        lambda f: f.exception() and print(f"⚠️  Warm-up failed: {f.exception()}"))
+    pool.shutdown(wait=False)
+    return warming
+
+
+def _mark_first_command(step: StepMetrics) -> None:
+    global first_command_s
+    if first_command_s is None:
+        first_command_s = time.perf_counter() - started_at
+        step.set("time_to_first_command_s", round(first_command_s, 3))
+        print(f"🚀  Time to first command: {first_command_s:.2f} s")
+
+
+def _print_usage(response: ChatResponse) -> None:
+    print(f"🧮  Prompt tokens → {response.prompt_eval_count} evaluated "
+          f"(≈{memory.tokens()} memory)")
+    print(f"🔢  Decision tokens → {response.eval_count} generated ({output_mode} mode)")
+
+
+def _stream_decision(messages: list, structured: bool, step: StepMetrics,
+                     **extra) -> tuple[list, str]:
+    """
+    Stream the reply and return `([x, theta], name)` as soon as the command
+    has been generated, without waiting for the reasoning that follows.
+    """
+    started = time.perf_counter()
+    parser = StreamCommandParser(structured)
+    decision = None
+    with step.span("inference"):
+        stream = chat(model=MODEL, messages=messages, stream=True, **extra)
+        for chunk in stream:
+            decision = parser.feed(chunk.message.content)
+            if chunk.done:
+                step.add_ollama(chunk)
+                _print_usage(chunk)
+            if decision is not None:
+                break
+    if decision is None:
+        print(parser.text)
+        return parser.finish()
+
+    print(f"⚡  Command after {time.perf_counter() - started:.2f} s → {parser.text.strip()}")
+    if stream_tail == "log":
+        # the step's record waits for the tail, so it gets the final token counts
+        step.background("stream-tail", _drain_stream, stream, parser, step)
     else:
-        print("i am rotating left or moving forward")
-    print("after", command_arr)
-    
-    # 6) Execute or skip as before
+        # closing the generator drops the HTTP stream, which makes Ollama
+        # abort the rest of the generation
+        stream.close()
+    return decision
+
+
+def _drain_stream(stream, parser: StreamCommandParser, step: StepMetrics) -> None:
+    for chunk in stream:
+        parser.text += chunk.message.content
+        if chunk.done:
+            step.add_ollama(chunk)
+            print(parser.text)
+            _print_usage(chunk)
+
+
+def confirm_command(command_arr: list, step: StepMetrics | None = None) -> bool:
+    """Ask the operator to approve a non-zero command."""
     if any(c != 0 for c in command_arr):
-        proceed = input("Proceed with command? y|n ").strip().lower() == "y"
-        if proceed:
-            send_move_command(command_arr)
-            # print("move")
-        return proceed
+        if auto_confirm:
+            return True
+        if step is None:
+            return input("Proceed with command? y|n ").strip().lower() == "y"
+        with step.span("confirm"):
+            return input("Proceed with command? y|n ").strip().lower() == "y"
     return False
 
 
+def call_ollama(image: str | bytes, step: StepMetrics | None = None) -> bool:
+    command_arr = decide_command(image, step=step)
+    
+    # 6) Execute or skip as before
+    proceed = confirm_command(command_arr, step)
+    if proceed:
+        send_move_command(command_arr, step=step)
+        # print("move")
+    return proceed
+
+
+def sense(client: RobotClient = robot, in_memory: bool = False,
+          step: StepMetrics | None = None) -> tuple[str | bytes, float]:
+    """Capture a frame and the centre distance for the next step, concurrently."""
+    if sampler is not None:
+        # the sampler already has the distances; only the frame needs a request
+        frame = step.timed("capture", client.capture) if step else client.capture()
+        distance = step.timed("distance", read_distance) if step else read_distance()
+    elif occupancy is None:
+        frame, distance = client.sense(timer=step)
+    else:
+        frame, distances = client.sense(all_angles=True, timer=step)
+        distance = observe(distances)
+    print(f"📏  Center distance → {distance:.3f} m")
+    if not in_memory:
+        return save_frame(prepare_frame(frame, step), step=step), distance
+    archive_frame(frame, step)
+    return prepare_frame(frame, step), distance
 
-if __name__ == "__main__":
-  img_path = fetch_image()
-  flag = call_ollama(img_path)
 
-  
-  print(flag)
-  while flag:
-      time.sleep(2)
-      img_path = fetch_image()
-      flag = call_ollama(img_path)
+def report_rate(steps: int, started: float) -> None:
+    elapsed = time.perf_counter() - started
+    if steps and elapsed > 0:
+        print(f"⏱️  {steps} steps in {elapsed:.1f} s → {60 * steps / elapsed:.1f} steps/min")
+
+
+def run_loop(max_steps: int | None = None, settle: float = 0.0, in_memory: bool = False,
+             concurrent_sense: bool = True) -> int:
+    """
+    Perceive → infer → act until the operator declines or `max_steps` moves.
+
+    Each move returns once the robot has settled, and the next step senses
+    straight away; `settle` adds an optional extra pause, e.g. for the
+    camera to stop shaking (the old loop slept 2 s without knowing whether
+    the motion had ended).  With `concurrent_sense` the frame and the
+    distance are fetched together (`sense()`); otherwise one after the
+    other, as the original loop did.  Sensing cannot overlap the move
+    itself: the next frame has to show where the move ended.
+    """
+    capture = fetch_frame if in_memory else fetch_image
+    started = time.perf_counter()
+    steps = 0
+    while max_steps is None or steps < max_steps:
+        step = metrics.start_step()
+        if concurrent_sense:
+            img, distance = sense(in_memory=in_memory, step=step)
+        else:
+            img, distance = capture(step=step), None
+        command_arr = decide_command(img, distance, step)
+        if not confirm_command(command_arr, step):
+            metrics.emit(step)
+            break
+        send_move_command(command_arr, step=step)
+        metrics.emit(step)
+        steps += 1
+        report_rate(steps, started)
+        if settle > 0:
+            time.sleep(settle)
+    report_rate(steps, started)
+    return steps
+
+
+def run_planned(max_steps: int | None = None, in_memory: bool = False) -> int:
+    """
+    Plan-mode loop: one inference yields a short sequence of moves that
+    are executed back-to-back.  Before each later move the distance is
+    re-read and the model is only asked again when the reading deviates
+    from what the plan implied, or when the plan is used up.
+    """
+    started = time.perf_counter()
+    steps = 0
+    inferences = 0
+    travelled = 0.0
+    while max_steps is None or steps < max_steps:
+        step = metrics.start_step()
+        img, distance = sense(in_memory=in_memory, step=step)
+        plan = decide_plan(img, distance, step)
+        inferences += 1
+        if not confirm_plan(plan, step):
+            metrics.emit(step)
+            break
+        before = distance
+        executed = 0
+        for command_arr, name in plan:
+            if executed:
+                now = step.timed("distance", read_distance)
+                reason = plan_deviation(plan[executed - 1][0], before, now, command_arr)
+                if reason:
+                    print(f"🔁  Re-planning after {executed}/{len(plan)} moves: {reason}")
+                    break
+                before = now
+            if not send_move_command(command_arr, step=step):
+                break
+            memory.add(command_arr, name, before)
+            travelled += abs(command_arr[0])
+            executed += 1
+            steps += 1
+            if max_steps is not None and steps >= max_steps:
+                break
+        step.set("executed", executed)
+        metrics.emit(step)
+        report_rate(steps, started)
+        if travelled:
+            print(f"🧭  {inferences} inferences for {travelled:.2f} m → {inferences / travelled:.2f} per metre")
+    return steps
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser(description="LLM navigation loop for the robot")
+  parser.add_argument("--pipelined", action="store_true",
+                      help="sense frame and distance concurrently as soon as each move has finished")
+  parser.add_argument("--plan", type=int, default=0, metavar="N",
+                      help="ask for up to N moves per inference and re-plan only when the sensors disagree")
+  parser.add_argument("--steps", type=int, default=None,
+                      help="stop after this many executed moves")
+  parser.add_argument("--settle", type=float, default=0.0,
+                      help="extra seconds to wait after a move has finished before sensing")
+  parser.add_argument("--in-memory", action="store_true",
+                      help="send frames to the model straight from memory instead of via captures/")
+  parser.add_argument("--archive", action="store_true",
+                      help="with --in-memory, still save frames to captures/ from a background thread")
+  parser.add_argument("--keep-frames", type=int, default=1000,
+                      help="keep at most this many frames in captures/, evicting the oldest")
+  parser.add_argument("--keep-mb", type=float, default=None,
+                      help="also keep captures/ under this many megabytes")
+  parser.add_argument("--content-names", action="store_true",
+                      help="name frames by content hash so repeated frames are stored once")
+  parser.add_argument("--archive-segments", type=int, default=0, metavar="N",
+                      help="pack evicted frames into compressed zip segments of N frames instead of deleting them")
+  parser.add_argument("--json", action="store_true",
+                      help="ask for a schema-constrained {command, x, theta} reply instead of free text")
+  parser.add_argument("--reasoning-chars", type=int, default=0,
+                      help="with --json, also request a reasoning field of at most this many characters")
+  parser.add_argument("--stream", action="store_true",
+                      help="stream the reply and act as soon as the command is complete")
+  parser.add_argument("--stream-tail", choices=["cancel", "log"], default="cancel",
+                      help="with --stream, cancel the rest of the reply or keep it for the log")
+  parser.add_argument("--metrics", metavar="PATH",
+                      help="append per-step stage timings and Ollama counters to this JSONL file")
+  parser.add_argument("--prometheus-port", type=int, default=None,
+                      help="serve step/stage latency histograms for Prometheus on this port")
+  parser.add_argument("--yes", action="store_true",
+                      help="execute commands without asking for confirmation")
+  parser.add_argument("--map", action="store_true",
+                      help="build an occupancy grid from /distance/all and describe free space in the prompt")
+  parser.add_argument("--safety", action="store_true",
+                      help="clamp/veto forward moves and stop in-flight moves from live distance readings")
+  parser.add_argument("--sampler", action="store_true",
+                      help="poll /distance/all in the background and read filtered distances from memory")
+  parser.add_argument("--sampler-hz", type=float, default=20.0,
+                      help="polling rate of the background sampler")
+  parser.add_argument("--median-ms", type=float, default=200.0,
+                      help="median filter window for sampled distances")
+  parser.add_argument("--backend", choices=["ollama", "transformers"], default="ollama",
+                      help="run the model through Ollama or in-process with transformers")
+  parser.add_argument("--hf-model", default="google/gemma-3-4b-it",
+                      help="model id for the transformers backend")
+  parser.add_argument("--device", default="cuda", help="transformers backend device (cuda or cpu)")
+  parser.add_argument("--threads", type=int, default=None,
+                      help="torch threads for the transformers backend on the CPU")
+  parser.add_argument("--quantize", action="store_true",
+                      help="dynamic int8 quantization for the transformers backend (CPU only)")
+  parser.add_argument("--frame-size", type=int, default=0, metavar="PX",
+                      help="resize frames to PX x PX before upload (896 for Gemma 3; 0 = send as captured)")
+  parser.add_argument("--frame-crop", metavar="L,T,R,B",
+                      help="crop frames to this box, in fractions of the frame, before resizing")
+  parser.add_argument("--frame-letterbox", action="store_true",
+                      help="keep the aspect ratio when resizing and pad to a square instead of stretching")
+  parser.add_argument("--jpeg-quality", type=int, default=85,
+                      help="JPEG quality used when re-encoding resized frames")
+  parser.add_argument("--cache", type=int, default=0, metavar="N",
+                      help="keep up to N decisions and reuse them while the scene is unchanged")
+  parser.add_argument("--cache-bits", type=int, default=6,
+                      help="frames whose 64-bit perceptual hashes differ in at most this many bits match")
+  parser.add_argument("--cache-reuse", type=int, default=3,
+                      help="ask the model again after a cached decision was reused this many times")
+  parser.add_argument("--keep-alive", default=KEEP_ALIVE, type=keep_alive_value,
+                      help="how long Ollama keeps the model loaded between requests (e.g. 30m, -1 = forever)")
+  parser.add_argument("--no-warm-up", action="store_true",
+                      help="skip loading the model with a dummy request at startup")
+  args = parser.parse_args()
+
+  if args.backend == "transformers":
+      from backends import TransformersEngine
+      chat = TransformersEngine(args.hf_model, device=args.device, threads=args.threads,
+                                quantize=args.quantize, max_batch=1)
+  else:
+      chat.keep_alive = args.keep_alive
+  # the model loads while the sensors below start and the first frame is captured
+  warming = None if args.no_warm_up else start_up()
+
+  median_ms = args.median_ms
+  if args.sampler or args.safety:
+      from sensors import SensorSampler
+      sampler = SensorSampler(robot, hz=args.sampler_hz).start()
+      sampler.wait_ready()
+  if args.safety:
+      from safety import SafetyMonitor
+      safety = SafetyMonitor(robot, sampler)
+
+  if args.map:
+      from occupancy_grid import OccupancyGrid
+      occupancy = OccupancyGrid()
+
+  auto_confirm = args.yes
+
+  if args.frame_size:
+      from preprocess import FramePreprocessor
+      crop = tuple(float(v) for v in args.frame_crop.split(",")) if args.frame_crop else None
+      preprocessor = FramePreprocessor(args.frame_size, crop, args.jpeg_quality,
+                                       keep_aspect=args.frame_letterbox)
+
+  if args.cache:
+      from decision_cache import DecisionCache
+      decision_cache = DecisionCache(args.cache, args.cache_bits, max_reuse=args.cache_reuse)
+
+  metrics = MetricsRecorder(args.metrics)
+  if args.prometheus_port:
+      metrics.serve_prometheus(args.prometheus_port)
+
+  streaming = args.stream
+  stream_tail = args.stream_tail
+
+  if args.json:
+      output_mode = "json"
+      reasoning_chars = args.reasoning_chars
+
+  if not args.in_memory or args.archive:
+      captures = CaptureStore(max_frames=args.keep_frames,
+                              max_bytes=int(args.keep_mb * 1e6) if args.keep_mb else None,
+                              naming="content" if args.content_names else "sequence",
+                              archive=args.archive_segments > 0,
+                              segment_frames=args.archive_segments or 200)
+  try:
+      if args.plan:
+          plan_steps = args.plan
+          run_planned(max_steps=args.steps, in_memory=args.in_memory)
+      else:
+          run_loop(max_steps=args.steps, settle=args.settle, in_memory=args.in_memory,
+                   concurrent_sense=args.pipelined)
+  finally:
+      print("📈 ", metrics.summary())
+      if preprocessor is not None:
+          print(f"🖼️  frames sent at {100 * preprocessor.ratio():.0f}% of their captured size")
+      if decision_cache is not None:
+          print(f"♻️  decision cache: {decision_cache.hits} hits, {decision_cache.misses} misses")
+      metrics.close()
+      chat.close()
+      if captures is not None:
+          captures.close()
+      if sampler is not None:
+          sampler.close()
 
 #   i = 5
 #   while i > 0:
 #     call_ollama("img1.jpg")
 #     i -= 1
 
-  #send_move_command([1,0], api_url="http://192.168.4.1:5000/move")
+  #send_move_command([1,0])
   #fetch_center_distance()
   #fetch_all_distances()
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""
+Door-finding prompt on Gemma 3 through the in-process transformers backend.
+
+The model is loaded once into a `TransformersEngine`; the reference door
+photo is pinned so its vision features are computed a single time (and
+kept under `--feature-cache` for later runs), and all live frames given
+on the command line go through one batched `generate` call:
+
+    python run_transformers.py unused_files/captured_image.jpg --device cpu --threads 8 --quantize
+
+Without arguments the sample photos in unused_files/ are used.
+"""
+import argparse
+from pathlib import Path
+
+from backends import TransformersEngine
+
+model_id = "google/gemma-3-4b-it"
+# sample photos that lived next to this script before it moved to the top level
+SAMPLES = Path(__file__).parent / "unused_files"
+
+
+SYSTEM_PROMPT = """You are **NavPilot**, an embodied-AI assistant that controls a wheeled indoor robot.
+
+### Capabilities you MAY use
+1. MOVE_FORWARD(<meters: float>)
+1. MOVE_BACKWARD(<meters: float>)
+2. ROTATE_LEFT(<degrees: int>)
+3. ROTATE_RIGHT(<degrees: int>)                                
+6. TAKE_PHOTO()                                        
+
+### Constraints
+- Never drive into obstacles or humans — if uncertain, prefer ROTATE_* + TAKE_PHOTO().
+- If the exit is not fully visible which is the glass door, choose an action that improves visibility, then TAKE_PHOTO().
+- Don't move forward if you are at a dead end or if the exit is not visible. The exit is a glass door that is fully visible.
+- Always take an image after executing the move commands. Don't take an image if you reached the final destination.
+- If there is not much distance infront of you, go rotate left or right to see more of the room.
+- If you don't see an exit, it is better to rotate to get a better view of the room.
+
+### Output format
+Return **exactly two lines**:
+1. The chosen commands, separated by semicolons.
+2. REASONING: followed by extensive explanation.
+
+Any extra text or missing line will be ignored by the controller."""
+
+
+def build_messages(door: Path, frame: Path) -> list:
+    return [
+        {"role": "system", "content": [{"type": "text", "text": SYSTEM_PROMPT}]},
+        {
+            "role": "user",
+            "content": [
+                # ---- reference photo of the target door ----
+                {
+                    "type": "text",
+                    "text": (
+                        "The **first image** shows what the EXIT DOOR looks like. "
+                        "Study it carefully so you can recognise it."
+                    ),
+                },
+                {"type": "image", "path": str(door)},
+
+                # ---- live robot camera frame ----
+                {
+                    "type": "text",
+                    "text": (
+                        "The **second image** is the robot’s current point-of-view "
+                        "inside the room. This is the image you will use to give commands."
+                    ),
+                },
+                {"type": "image", "path": str(frame)},
+
+                # ---- task instruction ----
+                {
+                    "type": "text",
+                    "text": (
+                        "If the door from the first image is already visible in the "
+                        "second image, navigate toward it.  Otherwise choose the best "
+                        "action to reveal it. Gnerate the command for the second image only. Remember to respond in the ‘command ; "
+                        "REASONING’ format."
+                    ),
+                },
+            ],
+        },
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ask Gemma 3 (transformers) for a command per frame")
+    parser.add_argument("frames", nargs="*", type=Path, default=[SAMPLES / "captured_image.jpg"],
+                        help="live camera frames (position)")
+    parser.add_argument("--door", type=Path, default=SAMPLES / "img4.jpg", help="reference photo of the exit")
+    parser.add_argument("--model-id", default=model_id)
+    parser.add_argument("--device", default="cuda", help="cuda or cpu")
+    parser.add_argument("--threads", type=int, default=None, help="torch intra-op threads on the CPU")
+    parser.add_argument("--quantize", action="store_true", help="dynamic int8 quantization (CPU only)")
+    parser.add_argument("--max-new-tokens", type=int, default=150)
+    parser.add_argument("--feature-cache", default="feature_cache",
+                        help="folder for the door photo's vision features ('' to disable)")
+    args = parser.parse_args()
+
+    engine = TransformersEngine(args.model_id, device=args.device, threads=args.threads,
+                                quantize=args.quantize, max_batch=max(1, len(args.frames)),
+                                max_new_tokens=args.max_new_tokens,
+                                feature_cache=args.feature_cache or None)
+    try:
+        engine.pin_image(args.door)
+        pending = [engine.submit(build_messages(args.door, frame)) for frame in args.frames]
+        for frame, reply in zip(args.frames, pending):
+            response = reply.result()
+            print(f"{frame}: {response.message.content.strip()}")
+    finally:
+        engine.close()
@@ -0,0 +1,95 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict
+
+from robot_client import RobotClient
+from sensors import SensorSampler
+
+
+class SafetyMonitor:
+    """
+    Deterministic reflex layer between the model and the motors.
+
+    It reads the `SensorSampler`'s ring buffer rather than polling itself.
+    Forward moves are checked against the newest reading just before they
+    are sent: shortened to keep `stop_distance` of clearance, or vetoed
+    when there is no room (or the readings are older than `max_age`).
+    While a forward move is in flight, the first sample below
+    `stop_distance` triggers `/stop` from the sampler thread, so a reaction
+    never waits on the model or on the move POST.
+    """
+
+    def __init__(self, client: RobotClient, sampler: SensorSampler,
+                 stop_distance: float = 0.5, max_age: float = 0.5, cone: int = 30,
+                 min_move: float = 0.05):
+        self.client = client
+        self.sampler = sampler
+        self.stop_distance = stop_distance
+        self.max_age = max_age
+        self.cone = cone
+        self.min_move = min_move
+        self.aborts = 0
+        self._moving_forward = False
+        self._stopped = False
+        self._lock = threading.Lock()
+        sampler.subscribe(self._on_sample)
+
+    def _ahead(self, distances: Dict[int, float]) -> list[float]:
+        return [d for a, d in distances.items() if abs(a) <= self.cone]
+
+    def clearance(self) -> float | None:
+        """Smallest fresh distance inside the forward cone, or None if stale."""
+        distances, age = self.sampler.latest()
+        ahead = self._ahead(distances)
+        if age > self.max_age or not ahead:
+            return None
+        return min(ahead)
+
+    def check(self, command: list) -> tuple[list | None, str]:
+        """
+        Return `(command, reason)` with forward motion clamped to the free
+        space, or `(None, reason)` when the move must not be sent.
+        """
+        x, theta = command
+        if x <= 0:
+            return command, "ok"
+        free = self.clearance()
+        if free is None:
+            return None, "no fresh distance reading"
+        allowed = free - self.stop_distance
+        if allowed < self.min_move:
+            return None, f"only {free:.2f} m ahead"
+        if x > allowed:
+            return [round(allowed, 2), theta], f"clamped to {allowed:.2f} m ({free:.2f} m ahead)"
+        return command, "ok"
+
+    @contextmanager
+    def watching(self, command: list):
+        """Watch the samples for the duration of the block (the move and its settling)."""
+        with self._lock:
+            self._moving_forward = command[0] > 0
+            self._stopped = False
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._moving_forward = False
+
+    def _on_sample(self, distances: Dict[int, float]) -> None:
+        with self._lock:
+            watching = self._moving_forward and not self._stopped
+        if not watching:
+            return
+        ahead = self._ahead(distances)
+        if ahead and min(ahead) < self.stop_distance:
+            self._abort(min(ahead))
+
+    def _abort(self, distance: float) -> None:
+        with self._lock:
+            self._stopped = True
+        self.aborts += 1
+        print(f"🛑  Clearance {distance:.2f} m during move, stopping")
+        try:
+            self.client.stop()
+        except RuntimeError as e:
+            print(f"⚠️  Stop request failed: {e}")
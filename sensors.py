@@ -0,0 +1,122 @@
+import threading
+import time
+from typing import Callable, Dict
+
+import numpy as np
+
+from robot_client import RobotClient
+
+
+class RingBuffer:
+    """Fixed-size, array-backed ring of timestamped multi-angle samples."""
+
+    def __init__(self, capacity: int, width: int):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.full((capacity, width), np.nan, dtype=np.float32)
+        self.capacity = capacity
+        self.head = 0   # next slot to write
+        self.count = 0
+
+    def append(self, t: float, row) -> None:
+        self.times[self.head] = t
+        self.values[self.head] = row
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def newest(self) -> tuple[float, np.ndarray] | None:
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return self.times[i], self.values[i].copy()
+
+    def since(self, t: float) -> np.ndarray:
+        """Rows stamped at or after `t` (in no particular order)."""
+        if self.count < self.capacity:
+            times, values = self.times[:self.count], self.values[:self.count]
+        else:
+            times, values = self.times, self.values
+        return values[times >= t]
+
+
+class SensorSampler:
+    """
+    Background poller of `/distance/all` into a timestamped ring buffer.
+
+    The controller reads from memory instead of making an HTTP call per
+    step: `latest()` is the newest sample, `median()` filters single noisy
+    ToF readings over a short window, and `age()` says how stale the data
+    is.  Listeners registered with `subscribe()` are called on the polling
+    thread for every new sample.
+    """
+
+    def __init__(self, client: RobotClient, hz: float = 20.0, capacity: int = 256,
+                 angles: tuple = (-30, 0, 30)):
+        self.client = client
+        self.period = 1.0 / hz
+        self.angles = tuple(angles)
+        self.errors = 0
+        self._buffer = RingBuffer(capacity, len(self.angles))
+        self._listeners: list[Callable[[Dict[int, float]], None]] = []
+        self._lock = threading.Lock()
+        self._fresh = threading.Event()
+        self._halt = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sensor-sampler", daemon=True)
+
+    def start(self) -> "SensorSampler":
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._halt.set()
+        self._thread.join()
+
+    def subscribe(self, listener: Callable[[Dict[int, float]], None]) -> None:
+        self._listeners.append(listener)
+
+    def wait_ready(self, timeout: float = 2.0) -> bool:
+        """Block until the first sample has arrived (startup only)."""
+        return self._fresh.wait(timeout)
+
+    def _as_dict(self, row: np.ndarray) -> Dict[int, float]:
+        return {a: float(v) for a, v in zip(self.angles, row) if not np.isnan(v)}
+
+    def latest(self) -> tuple[Dict[int, float], float]:
+        """Newest `{angle: metres}` sample and its age in seconds."""
+        with self._lock:
+            newest = self._buffer.newest()
+        if newest is None:
+            return {}, float("inf")
+        t, row = newest
+        return self._as_dict(row), time.monotonic() - t
+
+    def age(self) -> float:
+        """Seconds since the newest sample (inf before the first one)."""
+        return self.latest()[1]
+
+    def median(self, window_ms: float = 200.0, since: float = 0.0) -> Dict[int, float]:
+        """
+        Per-angle median over the samples from the last `window_ms`,
+        ignoring any taken before the monotonic time `since`.
+        """
+        with self._lock:
+            rows = self._buffer.since(max(time.monotonic() - window_ms / 1000, since))
+        if not len(rows):
+            return {}
+        return self._as_dict(np.nanmedian(rows, axis=0))
+
+    def _run(self) -> None:
+        while not self._halt.is_set():
+            started = time.monotonic()
+            try:
+                distances = self.client.all_distances()
+            except RuntimeError:
+                self.errors += 1
+            else:
+                row = [distances.get(a, np.nan) for a in self.angles]
+                # stamp with the request time: the reading is at least that old
+                with self._lock:
+                    self._buffer.append(started, row)
+                self._fresh.set()
+                for listener in self._listeners:
+                    listener(distances)
+            self._halt.wait(max(0.0, self.period - (time.monotonic() - started)))
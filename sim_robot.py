@@ -0,0 +1,204 @@
+"""
+Local stand-in for the robot's Flask API.
+
+Serves `/capture`, `/distance/center`, `/distance/all`, `/move`, `/move/status`
+and `/stop` with configurable latency and jitter so the control loop can be
+run and benchmarked without the physical robot:
+
+    python sim_robot.py --port 5000 --latency 0.03 --jitter 0.01
+    python sim_robot.py --move-speed 0.3 --async-moves   # /move returns before the motion ends
+    ROBOT_URL=http://127.0.0.1:5000 python run_ollama.py --pipelined
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FRAMES = sorted(glob.glob(os.path.join(HERE, "unused_files", "img*.jpg")))
+
+
+class SimRobot:
+    """
+    Simulated robot: a heading-dependent free distance ahead, shrunk by
+    forward moves, with Gaussian sensor noise and per-request delays.
+    """
+
+    def __init__(self, port: int = 0, latency: float = 0.02, jitter: float = 0.01,
+                 move_speed: float = 0.0, noise: float = 0.01,
+                 frames: list[str] | None = None, seed: int = 0, async_moves: bool = False):
+        self.latency = latency
+        self.jitter = jitter
+        # metres (or 45° units) per second; 0 = moves complete instantly
+        self.move_speed = move_speed
+        # answer /move with {"status": "moving"} straight away and drive in the background
+        self.async_moves = async_moves
+        self.noise = noise
+        self.rng = random.Random(seed)
+        self.frames = [open(p, "rb").read() for p in (frames or DEFAULT_FRAMES)]
+        self.heading = 0.0
+        self.progress = 0.0
+        self.moves = 0
+        self._room = {h: self.rng.uniform(0.6, 4.0) for h in range(0, 360, 15)}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+        self._idle.set()
+        self.last_move = {"status": "done", "x": 0.0, "theta": 0.0, "heading": 0.0}
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "SimRobot":
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name="sim-robot", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self) -> None:
+        time.sleep(max(0.0, self.rng.gauss(self.latency, self.jitter)))
+
+    def distance(self, angle: int = 0) -> float:
+        with self._lock:
+            h = int(round((self.heading + angle) / 15.0)) * 15 % 360
+            free = self._room[h] - (self.progress if angle == 0 else 0.0)
+            return max(0.05, free + self.rng.gauss(0.0, self.noise))
+
+    def move(self, x: float, theta: float) -> dict:
+        """Rotate, then drive; with a move speed the drive advances in 20 ms slices until done or stopped."""
+        self._stop.clear()
+        self._idle.clear()
+        if self.move_speed > 0 and theta:
+            time.sleep(abs(theta) / 45.0 / self.move_speed)
+        with self._lock:
+            self.moves += 1
+            if theta:
+                self.heading = (self.heading + theta) % 360
+                self.progress = 0.0
+            if self.move_speed <= 0:
+                self.progress += x
+        travelled = x
+        if self.move_speed > 0 and x:
+            travelled = 0.0
+            slice_m = self.move_speed * 0.02 * (1 if x > 0 else -1)
+            while abs(travelled) < abs(x) and not self._stop.is_set():
+                time.sleep(0.02)
+                step = slice_m if abs(travelled + slice_m) <= abs(x) else x - travelled
+                travelled += step
+                with self._lock:
+                    self.progress += step
+        status = "stopped" if self._stop.is_set() else "done"
+        self.last_move = {"status": status, "x": round(travelled, 3), "theta": theta,
+                          "heading": self.heading}
+        self._idle.set()
+        return self.last_move
+
+    def begin_move(self, x: float, theta: float) -> dict:
+        """Start a move on a background thread and acknowledge it immediately."""
+        self._idle.clear()
+        threading.Thread(target=self.move, args=(x, theta), name="sim-move", daemon=True).start()
+        return {"status": "moving", "x": x, "theta": theta}
+
+    def status(self, wait: float = 0.0) -> dict:
+        """Motion state; with `wait` hold the answer until the move ends or `wait` s pass."""
+        if wait > 0:
+            self._idle.wait(wait)
+        state = "idle" if self._idle.is_set() else "moving"
+        return {**self.last_move, "state": state} if state == "idle" else {"state": state}
+
+    def halt(self) -> dict:
+        self._stop.set()
+        return {"status": "stopping"}
+
+    def frame(self) -> bytes:
+        with self._lock:
+            return self.frames[self.moves % len(self.frames)]
+
+    def _handler(self):
+        sim = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, body: bytes, content_type: str = "application/json", status: int = 200):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, payload, status: int = 200):
+                self._send(json.dumps(payload).encode(), status=status)
+
+            def do_GET(self):
+                sim.delay()
+                url = urlsplit(self.path)
+                if url.path == "/move/status":
+                    wait = float(parse_qs(url.query).get("wait", ["0"])[0])
+                    self._json(sim.status(min(wait, 5.0)))
+                elif self.path == "/capture":
+                    self._send(sim.frame(), "image/jpeg")
+                elif self.path == "/distance/center":
+                    self._json({"angle": 0, "distance_m": round(sim.distance(), 3)})
+                elif self.path == "/distance/all":
+                    self._json({str(a): round(sim.distance(a), 3) for a in (-30, 0, 30)})
+                else:
+                    self._json({"error": f"unknown path {self.path}"}, 404)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                sim.delay()
+                if self.path == "/stop":
+                    self._json(sim.halt())
+                    return
+                if self.path != "/move":
+                    self._json({"error": f"unknown path {self.path}"}, 404)
+                    return
+                try:
+                    payload = json.loads(body)
+                    move = sim.begin_move if sim.async_moves else sim.move
+                    reply = move(float(payload["x"]), float(payload["theta"]))
+                except (ValueError, KeyError) as e:
+                    self._json({"error": str(e)}, 400)
+                    return
+                self._json(reply)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the robot API")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.02, help="mean seconds per request")
+    parser.add_argument("--jitter", type=float, default=0.01, help="std-dev of the request delay")
+    parser.add_argument("--move-speed", type=float, default=0.0,
+                        help="metres per second for /move (0 = instant)")
+    parser.add_argument("--async-moves", action="store_true",
+                        help="reply to /move at once and report completion on /move/status")
+    parser.add_argument("--noise", type=float, default=0.01, help="sensor noise std-dev in metres")
+    args = parser.parse_args()
+
+    sim = SimRobot(args.port, args.latency, args.jitter, args.move_speed, args.noise,
+                   async_moves=args.async_moves)
+    print(f"🤖  Simulated robot on {sim.url}")
+    try:
+        sim.server.serve_forever()
+    except KeyboardInterrupt:
+        sim.stop()
@@ -0,0 +1,148 @@
+"""
+TransformersEngine against a tiny randomly initialised Gemma 3, built
+offline (word-level tokenizer, 28x28 images, two text layers):
+
+    python -m pytest -q test_backends.py
+"""
+import io
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from PIL import Image
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+from backends import ChatBackend, TransformersEngine
+
+SPECIAL = ["<pad>", "<eos>", "<bos>", "<unk>", "<start_of_turn>", "<end_of_turn>",
+           "<start_of_image>", "<end_of_image>", "<image_soft_token>"]
+WORDS = ["user", "model", "system", "what", "do", "you", "see", "go", "left", "right", "door"]
+TEMPLATE = ("{{ bos_token }}{% for m in messages %}<start_of_turn>{{ m['role'] }}\n"
+            "{% for part in m['content'] %}{% if part['type'] == 'image' %}<start_of_image>"
+            "{% else %}{{ part['text'] }}{% endif %}{% endfor %}<end_of_turn>\n{% endfor %}"
+            "{% if add_generation_prompt %}<start_of_turn>model\n{% endif %}")
+
+
+def tiny_processor():
+    vocab = {token: i for i, token in enumerate(SPECIAL + WORDS)}
+    tok = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tok.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=tok, bos_token="<bos>", eos_token="<eos>", pad_token="<pad>",
+        unk_token="<unk>",
+        extra_special_tokens={"boi_token": "<start_of_image>", "eoi_token": "<end_of_image>",
+                              "image_token": "<image_soft_token>"})
+    image_processor = transformers.Gemma3ImageProcessor(size={"height": 28, "width": 28})
+    return transformers.Gemma3Processor(image_processor=image_processor, tokenizer=tokenizer,
+                                        chat_template=TEMPLATE, image_seq_length=4)
+
+
+def tiny_config(vocab_size: int):
+    return transformers.Gemma3Config(
+        text_config={"vocab_size": vocab_size, "hidden_size": 32, "intermediate_size": 64,
+                     "num_hidden_layers": 2, "num_attention_heads": 2, "num_key_value_heads": 1,
+                     "head_dim": 16, "sliding_window": 16, "max_position_embeddings": 256},
+        vision_config={"hidden_size": 32, "intermediate_size": 64, "num_hidden_layers": 1,
+                       "num_attention_heads": 2, "image_size": 28, "patch_size": 7},
+        mm_tokens_per_image=4, boi_token_index=6, eoi_token_index=7, image_token_index=8,
+        pad_token_id=0, bos_token_id=2, eos_token_id=1)
+
+
+def jpeg(color: str, size=(40, 30)) -> bytes:
+    out = io.BytesIO()
+    Image.new("RGB", size, color).save(out, "JPEG")
+    return out.getvalue()
+
+
+@pytest.fixture(scope="module")
+def model_and_processor():
+    processor = tiny_processor()
+    torch.manual_seed(0)
+    model = transformers.Gemma3ForConditionalGeneration(tiny_config(len(processor.tokenizer)))
+    return model, processor
+
+
+def engine(model_and_processor, **kwargs) -> TransformersEngine:
+    model, processor = model_and_processor
+    return TransformersEngine(model=model, processor=processor, max_new_tokens=6, **kwargs)
+
+
+DOOR = jpeg("red")
+REQUESTS = [
+    [{"role": "user", "content": "what do you see", "images": [DOOR, jpeg("blue")]}],
+    [{"role": "system", "content": "door"}, {"role": "user", "content": "go left", "images": [DOOR]}],
+]
+
+
+def test_chat_backend_is_abstract():
+    with pytest.raises(TypeError):
+        ChatBackend()
+
+
+def test_from_config_builds_an_engine():
+    processor = tiny_processor()
+    built = TransformersEngine.from_config(tiny_config(len(processor.tokenizer)), processor)
+    try:
+        reply = built(messages=[{"role": "user", "content": "go", "images": [DOOR]}])
+        assert reply.done and reply.eval_count > 0
+    finally:
+        built.close()
+
+
+def test_left_padded_batch_matches_single_requests(model_and_processor):
+    single = engine(model_and_processor, max_batch=1)
+    try:
+        expected = [single.submit(messages).result() for messages in REQUESTS]
+    finally:
+        single.close()
+
+    batched = engine(model_and_processor, max_batch=2, max_wait=1.0)
+    try:
+        batched.pin_image(DOOR)
+        futures = [batched.submit(messages) for messages in REQUESTS]
+        replies = [future.result() for future in futures]
+    finally:
+        batched.close()
+
+    # the two prompts differ in length, so the shorter one was left-padded
+    assert replies[0].prompt_eval_count != replies[1].prompt_eval_count
+    assert batched.batches == 1
+    assert [r.message.content for r in replies] == [r.message.content for r in expected]
+    assert [r.eval_count for r in replies] == [r.eval_count for r in expected]
+
+
+def test_pinned_image_is_not_encoded_again(model_and_processor):
+    pinned = engine(model_and_processor)
+    try:
+        key = pinned.pin_image(DOOR)
+        encoded = []
+        encode = pinned._encode
+        pinned._encode = lambda images: encoded.append(len(images)) or encode(images)
+        pinned.submit(REQUESTS[0]).result()
+        pinned.submit(REQUESTS[1]).result()
+    finally:
+        pinned.close()
+    assert key in pinned._pinned
+    # only the blue frame of the first request needed the vision tower
+    assert encoded == [1]
+    # and the pinned photo is recognised by its hash without being decoded
+    assert pinned._load(DOOR) == (key, None)
+
+
+def test_feature_cache_survives_a_restart(model_and_processor, tmp_path):
+    first = engine(model_and_processor, feature_cache=str(tmp_path))
+    try:
+        key = first.pin_image(DOOR)
+    finally:
+        first.close()
+    assert len(list(tmp_path.glob(f"*-{key}.pt"))) == 1
+
+    second = engine(model_and_processor, feature_cache=str(tmp_path))
+    try:
+        second._encode = lambda images: pytest.fail("cached features were encoded again")
+        second.pin_image(DOOR)
+        assert torch.equal(second._pinned[key], first._pinned[key])
+    finally:
+        second.close()
@@ -0,0 +1,105 @@
+"""
+CaptureStore: ring eviction, the (run, step) index, archive segments and
+reopening a folder:
+
+    python -m pytest -q test_capture_store.py
+"""
+import os
+import threading
+
+from capture_store import CaptureStore
+
+
+def frame(i: int) -> bytes:
+    return b"\xff\xd8" + i.to_bytes(4, "big") * 64
+
+
+def jpgs(folder) -> list[str]:
+    return sorted(p.name for p in folder.iterdir() if p.suffix == ".jpg")
+
+
+def test_ring_keeps_the_newest_frames(tmp_path):
+    store = CaptureStore(str(tmp_path), max_frames=3)
+    paths = [store.put(frame(i), step=i) for i in range(5)]
+    store.close()
+    assert jpgs(tmp_path) == [os.path.basename(p) for p in paths[2:]]
+    assert store.read(step=4) == frame(4)
+    assert store.read(step=0) is None
+    assert store.path(step=1) is None
+
+
+def test_content_names_store_a_frame_once(tmp_path):
+    store = CaptureStore(str(tmp_path), naming="content")
+    first = store.put(frame(7), step=1)
+    again = store.put(frame(7), step=2)
+    store.close()
+    assert first == again
+    assert len(jpgs(tmp_path)) == 1
+    assert store.read(step=2) == frame(7)
+
+
+def test_runs_keep_their_own_steps(tmp_path):
+    for run in (b"A", b"B"):
+        store = CaptureStore(str(tmp_path))
+        for step in (1, 2):
+            store.put(run + frame(step), step=step)
+        store.close()
+
+    replayed = CaptureStore(str(tmp_path), readonly=True)
+    assert replayed.run == 2
+    assert [(run, step) for run, step, _ in replayed.steps()] == [(1, 1), (1, 2), (2, 1), (2, 2)]
+    assert replayed.read(step=1, run=1) == b"A" + frame(1)
+    assert replayed.read(step=1) == b"B" + frame(1)
+
+
+def test_readonly_leaves_the_index_alone(tmp_path):
+    store = CaptureStore(str(tmp_path))
+    store.put(frame(1), step=1)
+    index = (tmp_path / "index.jsonl").read_bytes()
+
+    reader = CaptureStore(str(tmp_path), readonly=True)
+    assert reader.read(step=1, run=1) == frame(1)
+    reader.close()
+    store.close()
+    assert (tmp_path / "index.jsonl").read_bytes().startswith(index)
+
+
+def test_evicted_frames_are_archived_in_segments(tmp_path):
+    store = CaptureStore(str(tmp_path), max_frames=2, archive=True, segment_frames=2)
+    for i in range(7):
+        store.put(frame(i), step=i)
+    store.close()
+    # five evicted: two full segments plus a partial one written on close
+    assert sorted(p.name for p in tmp_path.glob("segment_*")) == [
+        "segment_000001.zip", "segment_000002.zip", "segment_000003.zip"]
+    assert len(jpgs(tmp_path)) == 2
+    reopened = CaptureStore(str(tmp_path), readonly=True)
+    assert [reopened.read(step=i, run=1) for i in range(7)] == [frame(i) for i in range(7)]
+
+
+def test_archiving_skips_frames_deleted_by_an_earlier_run(tmp_path):
+    store = CaptureStore(str(tmp_path), max_frames=2)
+    for i in range(5):
+        store.put(frame(i), step=i)
+    store.close()
+
+    store = CaptureStore(str(tmp_path), max_frames=2, archive=True, segment_frames=2)
+    for i in range(5):
+        store.put(frame(10 + i), step=i)
+    store.close()
+    assert not list(tmp_path.glob("*.tmp"))
+    assert len(jpgs(tmp_path)) == 2
+    assert store.read(step=0, run=1) is None
+    assert store.read(step=0, run=2) == frame(10)
+
+
+def test_submit_does_not_wait_for_a_write_in_progress(tmp_path):
+    store = CaptureStore(str(tmp_path), max_pending=1)
+    with store._lock:
+        # the writer is stuck mid-put; the control path must still return at once
+        submitter = threading.Thread(target=lambda: [store.submit(frame(i)) for i in range(3)])
+        submitter.start()
+        submitter.join(timeout=2)
+        assert not submitter.is_alive()
+    store.close()
+    assert store.dropped >= 1
@@ -0,0 +1,39 @@
+"""
+OccupancyGrid ray casting, unknown space and growth:
+
+    python -m pytest -q test_occupancy_grid.py
+"""
+import numpy as np
+
+from occupancy_grid import OccupancyGrid
+
+ANGLES = (-90, -60, -30, 0, 30, 60, 90)
+
+
+def test_wall_ahead_is_reported_and_unobserved_space_is_unknown():
+    grid = OccupancyGrid()
+    for _ in range(2):          # one hit alone is below OCCUPIED_THRESHOLD
+        grid.integrate(0, 0, 0, {0: 1.0})
+    d, known = grid.clearance(0, 0, 0, [0])[0]
+    assert known and abs(d - 1.0) <= grid.resolution
+    assert grid.clearance(0, 0, 0, [90])[90][1] is False
+    assert "+90°: unknown" in grid.describe(0, 0, 0)
+
+
+def test_queries_agree_before_and_after_the_grid_grows():
+    grid = OccupancyGrid()
+    grid.integrate(0, 0, 0, {a: 1.0 + 0.1 * i for i, a in enumerate(ANGLES)})
+    before = grid.clearance(0, 0, 0, ANGLES)
+    mapped = grid.grid.copy()
+    grid._grow()
+    assert grid.clearance(0, 0, 0, ANGLES) == before
+    assert np.count_nonzero(grid.grid) == np.count_nonzero(mapped)
+
+
+def test_leaving_the_initial_box_keeps_the_mapped_area():
+    grid = OccupancyGrid(size=8.0)
+    grid.integrate(0, 0, 0, {-30: 1.0, 0: 2.0})
+    before = grid.clearance(0, 0, 0, [-30, 0])
+    grid.integrate(3.5, 0, 0, {0: 3.0})        # ray ends past the 4 m edge
+    assert grid.shape[0] > 160
+    assert grid.clearance(0, 0, 0, [-30, 0]) == before
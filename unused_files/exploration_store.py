@@ -0,0 +1,161 @@
+import json
+import os
+from collections import deque
+
+from pose_index import PoseIndex
+
+LEGACY_LOG = "exploration_log.json"
+
+
+class ExplorationLog:
+    """
+    Append-only JSONL exploration log with a periodic snapshot.
+
+    Every accepted move is one line appended and fsync'd, so a step costs
+    O(1) I/O instead of rewriting the whole history.  Every
+    `snapshot_every` entries the current pose, the visited poses and the
+    byte offset of the log are written atomically to `<path>.snapshot`;
+    startup reads that snapshot and replays only the lines after it.  A
+    torn final line from a crash mid-write is cut off on load, and the
+    snapshot is replaced with `os.replace`, so neither file is ever left
+    half-written.
+
+    The snapshot keeps one pose per `merge_radius` m / `merge_heading`°
+    neighbourhood plus the `keep_recent` latest poses in order, so its
+    size depends on the area explored rather than the number of moves.
+    Keep the merge tolerances at most half the revisit tolerance, so every
+    dropped pose still has a kept one close enough to flag a revisit.
+    """
+
+    def __init__(self, path: str = "exploration_log.jsonl", snapshot_every: int = 50,
+                 merge_radius: float = 0.1, merge_heading: float = 10.0, keep_recent: int = 10):
+        self.path = path
+        self.snapshot_path = path + ".snapshot"
+        self.snapshot_every = snapshot_every
+        self.merge_radius = merge_radius
+        self.merge_heading = merge_heading
+        self.count = 0
+        self.pose = {"x": 0.0, "y": 0.0, "heading": 0.0}
+        self.visited = PoseIndex()
+        self._distinct = PoseIndex()
+        self._recent: deque = deque(maxlen=keep_recent)
+        self._offset = 0
+        self._file = None
+
+    def load(self) -> "ExplorationLog":
+        """Restore pose and visited positions, then open the log for appending."""
+        if not os.path.exists(self.path) and os.path.exists(LEGACY_LOG):
+            self._import_legacy(LEGACY_LOG)
+
+        offset = self._load_snapshot()
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if offset > size:
+            # the log is shorter than the snapshot says; rebuild from scratch
+            self.count, self.visited, self._distinct = 0, PoseIndex(), PoseIndex()
+            self._recent.clear()
+            self.pose = {"x": 0.0, "y": 0.0, "heading": 0.0}
+            offset = 0
+
+        good = offset
+        if size > offset:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    self._apply(entry)
+                    good += len(line)
+        if good < size:
+            print(f"⚠️  Dropping {size - good} bytes of a torn write at the end of {self.path}")
+            with open(self.path, "r+b") as f:
+                f.truncate(good)
+
+        self._offset = good
+        self._file = open(self.path, "ab")
+        return self
+
+    def append(self, entry: dict) -> None:
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        self._file.write(line)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._offset += len(line)
+        self._apply(entry)
+        if self.count % self.snapshot_every == 0:
+            self.write_snapshot()
+
+    def write_snapshot(self) -> None:
+        snapshot = {
+            "count": self.count,
+            "offset": self._offset,
+            "pose": self.pose,
+            "poses": [[round(v, 3) for v in pose] for pose in self._distinct.poses],
+            "recent": [[round(v, 3) for v in pose] for pose in self._recent],
+        }
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self.write_snapshot()
+            self._file.close()
+            self._file = None
+
+    def _apply(self, entry: dict) -> None:
+        self.count += 1
+        if isinstance(entry, dict) and "pose" in entry:
+            self.pose = entry["pose"]
+            self._track(self.pose.get("x", 0.0), self.pose.get("y", 0.0),
+                        self.pose.get("heading", 0.0))
+
+    def _track(self, x: float, y: float, heading: float) -> None:
+        self.visited.add(x, y, heading)
+        self._recent.append((x, y, heading))
+        if not self._distinct.visited_within(x, y, heading, self.merge_radius, self.merge_heading):
+            self._distinct.add(x, y, heading)
+
+    def _load_snapshot(self) -> int:
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        self.count = snapshot["count"]
+        self.pose = snapshot["pose"]
+        self.visited, self._distinct = PoseIndex(), PoseIndex()
+        for x, y, heading in snapshot["poses"]:
+            self.visited.add(x, y, heading)
+            self._distinct.add(x, y, heading)
+        # the latest poses go last, so PoseIndex.recent() sees them in order
+        for x, y, heading in snapshot.get("recent", []):
+            self.visited.add(x, y, heading)
+            self._recent.append((x, y, heading))
+        return snapshot["offset"]
+
+    def _import_legacy(self, legacy_path: str) -> None:
+        """One-off conversion of the old pretty-printed JSON list."""
+        try:
+            with open(legacy_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(entries, list):
+            return
+        # written aside and renamed, so a crash can't leave a short log that
+        # the next start would take as already imported
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        print(f"📦  Imported {len(entries)} entries from {legacy_path} into {self.path}")
@@ -0,0 +1,81 @@
+import math
+from collections import defaultdict
+
+
+def heading_diff(a: float, b: float) -> float:
+    """Smallest absolute difference between two headings in degrees."""
+    d = abs(a - b) % 360
+    return min(d, 360 - d)
+
+
+class PoseIndex:
+    """
+    Ordered pose history with a uniform grid hash over (x, y).
+
+    Poses are kept in insertion order for "most recent" queries and bucketed
+    into square cells of side `cell` metres, so a radius query only looks
+    at the few cells overlapping the search circle instead of every pose.
+    """
+
+    def __init__(self, cell: float = 0.25):
+        self.cell = cell
+        self.poses: list[tuple[float, float, float]] = []
+        self._grid: dict[tuple[int, int], list[int]] = defaultdict(list)
+
+    def __len__(self) -> int:
+        return len(self.poses)
+
+    def _cell(self, x: float, y: float) -> tuple[int, int]:
+        return (math.floor(x / self.cell), math.floor(y / self.cell))
+
+    def add(self, x: float, y: float, heading: float) -> None:
+        self._grid[self._cell(x, y)].append(len(self.poses))
+        self.poses.append((x, y, heading % 360))
+
+    def near(self, x: float, y: float, radius: float) -> list[int]:
+        """Indices of poses within `radius` metres of (x, y), oldest first."""
+        cx, cy = self._cell(x, y)
+        reach = math.ceil(radius / self.cell)
+        r2 = radius * radius
+        found = []
+        for i in range(cx - reach, cx + reach + 1):
+            for j in range(cy - reach, cy + reach + 1):
+                for idx in self._grid.get((i, j), ()):
+                    px, py, _ = self.poses[idx]
+                    if (px - x) ** 2 + (py - y) ** 2 <= r2:
+                        found.append(idx)
+        return sorted(found)
+
+    def visited_within(self, x: float, y: float, heading: float,
+                       radius: float = 0.2, dheading: float = 20.0) -> bool:
+        """True if a pose within `radius` m and `dheading` degrees was already recorded."""
+        return any(heading_diff(self.poses[idx][2], heading) <= dheading
+                   for idx in self.near(x, y, radius))
+
+    def nearest(self, x: float, y: float, k: int = 5) -> list[tuple[float, float, float]]:
+        """The `k` poses closest to (x, y), searching outward ring by ring."""
+        if not self.poses:
+            return []
+        k = min(k, len(self.poses))
+        cx, cy = self._cell(x, y)
+        candidates: list[tuple[float, int]] = []
+        ring = 0
+        while True:
+            for i in range(cx - ring, cx + ring + 1):
+                for j in range(cy - ring, cy + ring + 1):
+                    if max(abs(i - cx), abs(j - cy)) != ring:
+                        continue
+                    for idx in self._grid.get((i, j), ()):
+                        px, py, _ = self.poses[idx]
+                        candidates.append(((px - x) ** 2 + (py - y) ** 2, idx))
+            candidates.sort()
+            # everything outside the searched square is at least `ring * cell` away
+            if len(candidates) >= k and candidates[k - 1][0] <= (ring * self.cell) ** 2:
+                break
+            if len(candidates) == len(self.poses):
+                break
+            ring += 1
+        return [self.poses[idx] for _, idx in candidates[:k]]
+
+    def recent(self, k: int = 10) -> list[tuple[float, float, float]]:
+        return self.poses[-k:]
@@ -1,13 +1,13 @@
 import time
 import ast
 import os
-import json
 import math
 from datetime import datetime
 from zoneinfo import ZoneInfo  
 from ollama import chat, ChatResponse
 import requests
 import pyttsx3
+from exploration_store import ExplorationLog
 from typing import Dict
 
 # Text-to-speech setup
@@ -42,34 +42,22 @@ class Pose:
     def pos_key(self, precision: int = 2):
         return (round(self.x, precision), round(self.y, precision), round(self.heading))
 
+# A pose this close to an earlier one (metres / degrees) counts as a revisit
+REVISIT_RADIUS = 0.2
+REVISIT_HEADING = 20.0
+
 # Globals
-current_pose = Pose()
-log_file = 'exploration_log.json'
-# Load existing exploration log with empty-file handling
-if os.path.exists(log_file):
-    try:
-        with open(log_file, 'r') as f:
-            content = f.read()
-            if content.strip():
-                exploration_log = json.loads(content)
-                if not isinstance(exploration_log, list):
-                    exploration_log = []
-            else:
-                exploration_log = []
-    except (json.JSONDecodeError, ValueError):
-        exploration_log = []
-    # Rebuild visited from log entries
-    visited = {
-        (round(entry.get('pose', {}).get('x', 0.0), 2),
-         round(entry.get('pose', {}).get('y', 0.0), 2),
-         round(entry.get('pose', {}).get('heading', 0.0)))
-        for entry in exploration_log
-        if isinstance(entry, dict) and 'pose' in entry
-    }
-    visited.add(current_pose.pos_key())
-else:
-    exploration_log = []
-    visited = {current_pose.pos_key()}
+log_file = 'exploration_log.jsonl'
+# Append-only log; resumes from its snapshot plus the lines written after it
+exploration_log = ExplorationLog(log_file).load()
+# carry on from where the last session left the robot
+current_pose = Pose(exploration_log.pose.get("x", 0.0), exploration_log.pose.get("y", 0.0),
+                    exploration_log.pose.get("heading", 0.0))
+# Spatial index over every recorded pose, in visiting order
+visited = exploration_log.visited
+if not len(visited):
+    # only a fresh log starts at the origin; a resumed one already has its poses
+    visited.add(current_pose.x, current_pose.y, current_pose.heading)
 
 # System prompt
 SYSTEM_PROMPT = """
@@ -138,7 +126,7 @@ def call_ollama(image_path: str) -> bool:
 
     # Serialize pose and visited context
     pose_descr = f"POSITION: x={current_pose.x:.2f}, y={current_pose.y:.2f}, heading={current_pose.heading:.0f}°."
-    recent = list(visited)[-10:]
+    recent = visited.recent(10)
     visited_descr = "VISITED: " + ", ".join(f"({x:.1f},{y:.1f})" for x,y,_ in recent)
 
     # Build exploratory prompt
@@ -170,7 +158,8 @@ def call_ollama(image_path: str) -> bool:
     # Check revisit
     temp_pose = Pose(current_pose.x, current_pose.y, current_pose.heading)
     temp_pose.update(command_arr)
-    if temp_pose.pos_key() in visited:
+    if visited.visited_within(temp_pose.x, temp_pose.y, temp_pose.heading,
+                              REVISIT_RADIUS, REVISIT_HEADING):
         print(f"⚠️ Already visited {temp_pose.pos_key()}, skipping")
         return False
 
@@ -180,17 +169,13 @@ def call_ollama(image_path: str) -> bool:
         if proceed:
             # send_move_command(command_arr)
             current_pose.update(command_arr)
-            visited.add(current_pose.pos_key())
-            # Append new entry
+            # Append new entry (one fsync'd line, no rewrite of the history)
             exploration_log.append({
                 "image": image_path,
                 "command": command_arr,
                 "reasoning": reasoning,
                 "pose": {"x": current_pose.x, "y": current_pose.y, "heading": current_pose.heading}
             })
-            # Write full log
-            with open(log_file, 'w') as f:
-                json.dump(exploration_log, f, indent=2)
         return proceed
     return False
 